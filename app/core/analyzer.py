@@ -1,67 +1,230 @@
 
+import logging
 from app.core.face_detection import FaceDetector
 from app.core.geometry import GeometryChecker
 from app.core.quality import QualityChecker
 from app.core.background import BackgroundChecker
+from app.core.context import AnalysisContext
+from app.core.edits import STAGE_DEPENDENCIES
+from app.core.geometry import transform_face, DetectedFace
+from app.core.cache import ResultCache
+from app.core.instrumentation import Profiler
+from app.core.log import correlation
+from app.core.rules import STAGE_ORDER
 
-class Analyzer:
+logger = logging.getLogger(__name__)
+
+class AnalysisResult:
+    """
+    Outcome of one analysis: meta, chosen face and the per-stage results.
+    Keeping stages separate lets re-analysis replace only what an edit invalidated.
+    timings (optional) holds the per-stage instrumentation of this run.
+    measurements holds the raw per-stage metrics the results were derived
+    from, so stored reports can be re-scored against new thresholds (see rescore.py).
+    """
+    crashed = False # Set on results of failed analyses (never cached)
+
+    def __init__(self, meta, face, stages, timings=None, measurements=None):
+        self.meta = meta
+        self.face = face
+        self.stages = stages
+        self.timings = timings
+        self.measurements = measurements or {}
+        self.report = self._compose()
+        if timings is not None:
+            self.report['timings'] = timings
+
+    def _compose(self):
+        report = {'meta': self.meta}
+        if self.face is None:
+            return report
+        report['face_bbox'] = self.face.bbox.tolist()
+        for name in STAGE_ORDER:
+            report.update(self.stages.get(name, {}))
+        if self.measurements:
+            report['measurements'] = self.measurements
+            
+        # Determine overall Pass/Fail
+        failed = [k for k, v in report.items() if isinstance(v, dict) and not v.get('passed', True)]
+        report['is_passed'] = len(failed) == 0
+        return report
+
+    def to_payload(self):
+        """
+        Plain dict for the result cache (timings are per run and not kept).
+        """
+        face = None
+        if self.face is not None:
+            face = {'bbox': self.face.bbox, 'kps': getattr(self.face, 'kps', None),
+                    'det_score': getattr(self.face, 'det_score', None)}
+        return {'meta': self.meta, 'face': face, 'stages': self.stages, 'measurements': self.measurements}
+
+    @classmethod
+    def from_payload(cls, payload):
+        face = payload.get('face')
+        if face is not None:
+            face = DetectedFace(face['bbox'], face.get('kps'), face.get('det_score'))
+        return cls(payload['meta'], face, payload['stages'], measurements=payload.get('measurements'))
+
+class GeometryAnalyzer:
+    """
+    Face detection + geometry checks only (live camera guidance).
+    Holds its own FaceDetector (the models come from the shared registry),
+    so it can run on a different thread than a full Analyzer.
+    """
     def __init__(self, config):
         self.config = config
-        self.detector = FaceDetector()
+        self.detector = FaceDetector.from_config(config)
         self.geometry = GeometryChecker(config)
+        # Per-stage timings (no-op unless instrumentation.enabled)
+        self.profiler = Profiler.from_config(config)
+        inst_cfg = config.get('instrumentation', {}) or {}
+        self.timings_in_report = inst_cfg.get('include_in_report', True)
+
+    def analyze_geometry(self, img_bgr):
+        """
+        Face detection + geometry checks only (live camera guidance).
+        Skips the background and quality checks.
+        """
+        report = {}
+        ctx = AnalysisContext(img_bgr)
+        prof = self.profiler.begin()
+        with prof.stage('detection'):
+            face = self._detect(img_bgr, ctx, report)
+        stages = {}
+        if face is not None:
+            h, w = img_bgr.shape[:2]
+            with prof.stage('geometry'):
+                stages['geometry'] = self.geometry.check_processed_image(face, h, w)
+        result = AnalysisResult(report['meta'], face, stages, self._finish(prof, img_bgr, mode='live'))
+        return result.report, result.face
+
+    def _finish(self, prof, img_bgr, incremental=False, mode=None):
+        """
+        Close the profiling run; returns the timings for the report (or None).
+        """
+        h, w = img_bgr.shape[:2]
+        mode = mode or ('incremental' if incremental else 'full')
+        timings = self.profiler.finish(prof, mode=mode, width=w, height=h)
+        return timings if self.timings_in_report else None
+
+    def _detect(self, img_bgr, ctx, report):
+        """
+        Detect faces and pick the one to analyze; fills report['meta'].
+        Returns None if no face was found.
+        """
+        faces, _ = self.detector.detect_faces(img_bgr, ctx=ctx)
+        
+        if len(faces) == 0:
+            report['meta'] = {'passed': False, 'msg': "No face detected"}
+            return None
+        elif len(faces) > 1:
+            # We could select the largest face, but strict adherence says one person.
+            # For now, pick largest.
+            faces = sorted(faces, key=lambda f: (f.bbox[2]-f.bbox[0]) * (f.bbox[3]-f.bbox[1]), reverse=True)
+            report['meta'] = {'passed': False, 'msg': "Multiple faces, analyzing largest"}
+        else:
+            report['meta'] = {'passed': True, 'msg': "One face detected"}
+            
+        return faces[0]
+
+class Analyzer(GeometryAnalyzer):
+    """
+    Full analysis: detection, background, quality and geometry checks.
+    Not thread-safe (the detector keeps per-image state); use one instance
+    per thread, e.g. a GeometryAnalyzer for live guidance.
+    """
+    def __init__(self, config):
+        super().__init__(config)
         self.quality = QualityChecker(config)
         self.background = BackgroundChecker(config)
+        # Results of full analyses by image content (None when disabled)
+        self.cache = ResultCache.from_config(config)
         
     def analyze(self, img_bgr):
         """
         Run all checks on the image.
         """
-        report = {}
+        result = self.run(img_bgr)
+        return result.report, result.face
+
+    def run(self, img_bgr, previous=None, edit=None):
+        """
+        Run the checks and return an AnalysisResult.
+        With the previous result and the Edit that produced img_bgr from its
+        image, detection is skipped (the face is carried through the edit
+        matrix) and only the stages the edit invalidates are recomputed.
+        Log records emitted meanwhile carry the caller's correlation id, or a
+        new one per call.
+        """
+        with correlation():
+            incremental = previous is not None and previous.face is not None and edit is not None
+            if self.cache is None or incremental:
+                return self._run(img_bgr, previous, edit)
+            
+            # Full analyses of pixel-identical images (re-uploads, resets) are served from the cache
+            key = self.cache.key(img_bgr)
+            payload = self.cache.get(key)
+            if payload is not None:
+                logger.debug("result cache hit %s", key)
+                return AnalysisResult.from_payload(payload)
+            result = self._run(img_bgr, previous, edit)
+            if not result.crashed:
+                self.cache.put(key, result.to_payload())
+            return result
+
+    def _run(self, img_bgr, previous, edit):
+        # Derived buffers (gray, half-scale, proxy...) are computed once and shared
+        ctx = AnalysisContext(img_bgr)
+        incremental = previous is not None and previous.face is not None and edit is not None
+        prof = self.profiler.begin()
         
         try:
             # 1. Face Detection
-            faces, _ = self.detector.detect_faces(img_bgr)
-            
-            if len(faces) == 0:
-                report['meta'] = {'passed': False, 'msg': "No face detected"}
-                return report, None
-            elif len(faces) > 1:
-                report['meta'] = {'passed': False, 'msg': "Multiple faces detected"}
-                # We could select the largest face, but strict adherence says one person.
-                # For now, pick largest.
-                faces = sorted(faces, key=lambda f: (f.bbox[2]-f.bbox[0]) * (f.bbox[3]-f.bbox[1]), reverse=True)
-                report['meta'] = {'passed': False, 'msg': "Multiple faces, analyzing largest"}
+            if incremental:
+                meta = dict(previous.meta)
+                face = transform_face(previous.face, edit.matrix)
+                todo = edit.stages()
+                stages = dict(previous.stages)
+                measurements = dict(previous.measurements)
             else:
-                report['meta'] = {'passed': True, 'msg': "One face detected"}
-                
-            face = faces[0]
-            report['face_bbox'] = face.bbox.tolist()
+                report = {}
+                with prof.stage('detection'):
+                    face = self._detect(img_bgr, ctx, report)
+                meta = report['meta']
+                todo = set(STAGE_DEPENDENCIES)
+                stages = {}
+                measurements = {}
+                if face is None:
+                    return AnalysisResult(meta, None, stages, self._finish(prof, img_bgr))
             
             # 2. Background Checks
             # Returns results AND an optional mask (if it generated one)
-            bg_res, bg_mask = self.background.check_background(img_bgr, face.bbox)
-            report.update(bg_res)
+            bg_mask = None
+            if 'background' in todo:
+                with prof.stage('background'):
+                    measurements['background'], bg_mask = self.background.measure_background(img_bgr, face.bbox, ctx=ctx)
+                    stages['background'] = self.background.evaluate(measurements['background'])
             
             # 3. Quality Checks (Global)
             # Pass the mask from background check to quality check for better uniformity
-            quality_res = self.quality.check_quality(img_bgr, bg_mask=bg_mask)
-            report.update(quality_res)
+            if 'quality' in todo:
+                with prof.stage('quality'):
+                    measurements['quality'] = self.quality.measure(img_bgr, bg_mask=bg_mask, ctx=ctx)
+                    stages['quality'] = self.quality.evaluate(measurements['quality'])
             
             # 4. Geometry Checks
-            h, w = img_bgr.shape[:2]
-            geo_res = self.geometry.check_processed_image(face, h, w)
-            report.update(geo_res)
-            
-            # Determine overall Pass/Fail
-            failed = [k for k, v in report.items() if isinstance(v, dict) and not v.get('passed', True)]
-            report['is_passed'] = len(failed) == 0
+            if 'geometry' in todo:
+                h, w = img_bgr.shape[:2]
+                with prof.stage('geometry'):
+                    measurements['geometry'] = self.geometry.measure(face, h, w)
+                    stages['geometry'] = self.geometry.evaluate(measurements['geometry'])
             
-            return report, face
+            return AnalysisResult(meta, face, stages, self._finish(prof, img_bgr, incremental), measurements)
             
         except Exception as e:
             # Catch-all for analysis errors to prevent UI from showing nothing
-            print(f"ERROR in Analyzer: {e}")
-            import traceback
-            traceback.print_exc()
-            report['meta'] = {'passed': False, 'msg': f"Analysis Crash: {str(e)}"}
-            return report, None
+            logger.exception("Analysis failed")
+            result = AnalysisResult({'passed': False, 'msg': f"Analysis Crash: {str(e)}"}, None, {})
+            result.crashed = True
+            return result
@@ -1,54 +1,86 @@
 
 import cv2
 import numpy as np
+from app.core.context import AnalysisContext
+from app.core.segmentation import get_segmenter
+# Pass/fail limits (config 'background' section) are resolved in app.core.rules
+from app.core.rules import resolve_limits, passes
+
+def region_stats(gray, mask, grid=(6, 4), min_coverage=0.1):
+    """
+    Per-tile mean/std of the masked pixels of gray, from summed-area tables.
+    The integral images are built once in O(pixels); each tile is then four lookups.
+    :param grid: (rows, cols)
+    :param min_coverage: Tiles with less masked area than this fraction are NaN
+    :return: (mean, std, coverage) arrays of shape grid
+    """
+    rows, cols = grid
+    h, w = gray.shape[:2]
+    masked = cv2.bitwise_and(gray, gray, mask=mask)
+    sums, sq_sums = cv2.integral2(masked, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    counts = cv2.integral((mask > 0).view(np.uint8), sdepth=cv2.CV_64F)
+
+    ys = np.linspace(0, h, rows + 1).astype(int)
+    xs = np.linspace(0, w, cols + 1).astype(int)
+
+    def tile_sums(integral):
+        return (integral[np.ix_(ys[1:], xs[1:])] - integral[np.ix_(ys[:-1], xs[1:])]
+                - integral[np.ix_(ys[1:], xs[:-1])] + integral[np.ix_(ys[:-1], xs[:-1])])
+
+    n = tile_sums(counts)
+    area = np.outer(np.diff(ys), np.diff(xs))
+    coverage = n / np.maximum(area, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = tile_sums(sums) / n
+        var = tile_sums(sq_sums) / n - mean ** 2
+    std = np.sqrt(np.maximum(var, 0))
+    empty = coverage < min_coverage
+    mean[empty] = np.nan
+    std[empty] = np.nan
+    return mean, std, coverage
+
+def _grid_to_list(values, digits=1):
+    return [[None if np.isnan(v) else round(float(v), digits) for v in row] for row in values]
+
+def _list_to_grid(values):
+    return np.array([[np.nan if v is None else v for v in row] for row in values], dtype=np.float64)
 
 class BackgroundChecker:
     def __init__(self, config):
         self.config = config
-        # Assuming segmenter is initialized elsewhere or passed in config
-        self.segmenter = None # Placeholder for a segmentation model
+        self.map_grid = tuple(config.get('background', {}).get('map_grid', (6, 4)))
+        # Shared ONNX person segmenter if configured, else None (flood fill)
+        self.segmenter = get_segmenter(config)
+        self.limits = resolve_limits(config)
 
-    def check_background(self, img_bgr, face_bbox):
+    def check_background(self, img_bgr, face_bbox, ctx=None):
         """
         Check if background is uniform/light enough.
         Returns (results, mask).
         """
-        results = {}
+        measurements, mask = self.measure_background(img_bgr, face_bbox, ctx=ctx)
+        return self.evaluate(measurements), mask
+
+    def measure_background(self, img_bgr, face_bbox, ctx=None):
+        """
+        Raw background metrics (pixel count, max channel std, mean brightness,
+        per-tile mean/std); no thresholds applied.
+        Returns (measurements, mask).
+        """
+        ctx = AnalysisContext.of(img_bgr, ctx)
         
-        # 1. Simple color check on corners?
-        # Or use the segmentation model if available.
-        mask = None
-        # Placeholder for future segmentation model usage
+        # 1. Segmentation model if available (one cached matte per image,
+        # reused by the background replacement)
         h, w = img_bgr.shape[:2]
-        
-        # 2. Improved Heuristic: Flood Fill from corners
-        # This assumes the top corners are definitely background.
-        
-        # Resize for speed and noise reduction
-        scale = 0.5
-        small_img = cv2.resize(img_bgr, (0,0), fx=scale, fy=scale)
+        small_img = ctx.half
         h_s, w_s = small_img.shape[:2]
         
-        # Create a mask for floodFill (needs to be h+2, w+2)
-        # 0 = Unfilled, 255 = Filled
-        # NOTE: openCV floodFill mask needs to be uint8
-        fill_mask = np.zeros((h_s+2, w_s+2), np.uint8)
-        
-        # Tolerance for color difference
-        # If the background is truly uniform, variance is low.
-        # But allow some lighting gradient.
-        lo_diff = (8, 8, 8)
-        up_diff = (8, 8, 8)
-        
-        # 4 connectivity, Fill Value 255, Mask Only, Fixed Range (compare to seed)
-        flags = 4 | (255 << 8) | cv2.FLOODFILL_MASK_ONLY | cv2.FLOODFILL_FIXED_RANGE
-        
-        # FloodFill from top-left and top-right (standard logical background spots)
-        cv2.floodFill(small_img, fill_mask, (0, 0), 0, lo_diff, up_diff, flags)
-        cv2.floodFill(small_img, fill_mask, (w_s-1, 0), 0, lo_diff, up_diff, flags)
-        
-        # Extract the actual mask (remove padding)
-        final_mask_small = fill_mask[1:-1, 1:-1]
+        if self.segmenter is not None:
+            matte = self.segmenter.segment(img_bgr)
+            matte_small = cv2.resize(matte, (w_s, h_s), interpolation=cv2.INTER_LINEAR)
+            final_mask_small = np.where(matte_small < 0.5, 255, 0).astype(np.uint8)
+        else:
+            final_mask_small = self._flood_fill_mask(small_img)
         
         # Resize back to original size
         mask = cv2.resize(final_mask_small, (w, h), interpolation=cv2.INTER_NEAREST)
@@ -62,19 +94,43 @@ class BackgroundChecker:
         y2 = h # Exclude everything below face
         
         cv2.rectangle(mask, (x1, y1), (x2, y2), 0, -1)
+        # Same exclusion on the half-scale mask used for the region map
+        sx, sy = w_s / w, h_s / h
+        cv2.rectangle(final_mask_small, (int(x1 * sx), int(y1 * sy)), (int(x2 * sx), h_s), 0, -1)
         
-        # Analyze Background region
-        bg_pixels = img_bgr[mask == 255]
+        # Analyze Background region (masked stats, no pixel copies)
+        stats = ctx.masked_stats(mask)
         
-        if len(bg_pixels) == 0:
-            return {'background': {'passed': False, 'msg': "Face covers entire image"}}, mask
+        if stats['count'] == 0:
+            return {'count': 0}, mask
             
-        std_dev = np.std(bg_pixels, axis=0) # Per channel std
-        mean_val = np.mean(bg_pixels, axis=0)
+        std_dev = stats['std_bgr'] # Per channel std
+        mean_val = stats['mean_bgr']
+        
+        # Regional map (informational): localizes shadows without re-running on crops
+        map_mean, map_std, _ = region_stats(ctx.half_gray, final_mask_small, self.map_grid)
+        
+        return {
+            'count': int(stats['count']),
+            'max_std': float(np.max(std_dev)),
+            # BGR -> Mean should be high
+            'brightness': float(np.mean(mean_val)),
+            'map_mean': _grid_to_list(map_mean, 3),
+            'map_std': _grid_to_list(map_std, 3),
+        }, mask
+
+    def evaluate(self, m):
+        """
+        Pass/fail results for measure_background() output against the configured limits.
+        """
+        results = {}
+        L = self.limits
+        if not passes('background', 'background', m, L):
+            return {'background': {'passed': False, 'msg': "Face covers entire image"}}
         
         # Check uniformity
-        max_std = np.max(std_dev)
-        if max_std > 40: # Threshold for uniformity
+        max_std = m['max_std']
+        if not passes('background', 'uniformity', m, L): # Threshold for uniformity
              results['uniformity'] = {
                  'passed': False, 
                  'value': round(max_std, 2), 
@@ -84,9 +140,8 @@ class BackgroundChecker:
              results['uniformity'] = {'passed': True, 'value': round(max_std, 2), 'msg': "Uniform"}
 
         # Check brightness (Light gray/White)
-        # BGR -> Mean should be high
-        brightness = np.mean(mean_val)
-        if brightness < 150:
+        brightness = m['brightness']
+        if not passes('background', 'brightness', m, L):
              results['brightness'] = {
                  'passed': False, 
                  'value': round(brightness, 2), 
@@ -95,4 +150,57 @@ class BackgroundChecker:
         else:
              results['brightness'] = {'passed': True, 'value': round(brightness, 2), 'msg': "OK"}
              
-        return results, mask
+        if 'map_mean' in m:
+            results['background_map'] = self.region_map(_list_to_grid(m['map_mean']), _list_to_grid(m['map_std']))
+        
+        return results
+
+    def _flood_fill_mask(self, small_img):
+        """
+        Heuristic background mask: Flood Fill from the top corners.
+        This assumes the top corners are definitely background.
+        """
+        h_s, w_s = small_img.shape[:2]
+        
+        # Create a mask for floodFill (needs to be h+2, w+2)
+        # 0 = Unfilled, 255 = Filled
+        # NOTE: openCV floodFill mask needs to be uint8
+        fill_mask = np.zeros((h_s+2, w_s+2), np.uint8)
+        
+        # Tolerance for color difference
+        # If the background is truly uniform, variance is low.
+        # But allow some lighting gradient.
+        lo_diff = (8, 8, 8)
+        up_diff = (8, 8, 8)
+        
+        # 4 connectivity, Fill Value 255, Mask Only, Fixed Range (compare to seed)
+        flags = 4 | (255 << 8) | cv2.FLOODFILL_MASK_ONLY | cv2.FLOODFILL_FIXED_RANGE
+        
+        # FloodFill from top-left and top-right (standard logical background spots)
+        cv2.floodFill(small_img, fill_mask, (0, 0), 0, lo_diff, up_diff, flags)
+        cv2.floodFill(small_img, fill_mask, (w_s-1, 0), 0, lo_diff, up_diff, flags)
+        
+        # Extract the actual mask (remove padding)
+        return fill_mask[1:-1, 1:-1]
+
+    def region_map(self, mean, std):
+        """
+        Heatmap of background uniformity/brightness per tile (NaN = not enough
+        background), with the tiles that would fail the global limits listed as [row, col].
+        """
+        valid = ~np.isnan(std)
+        uneven = np.argwhere(valid & (std > self.limits['bg_max_std'])).tolist()
+        dark = np.argwhere(valid & (mean < self.limits['bg_min_brightness'])).tolist()
+        
+        if uneven or dark:
+            msg = f"{len(uneven)} uneven, {len(dark)} dark region(s)"
+        else:
+            msg = "All regions OK"
+        return {
+            'grid': list(self.map_grid),
+            'mean': _grid_to_list(mean),
+            'std': _grid_to_list(std),
+            'uneven_tiles': uneven,
+            'dark_tiles': dark,
+            'msg': msg,
+        }
@@ -0,0 +1,138 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+try:
+    import xxhash
+except ImportError: # Optional: ~10x faster hashing of large photos
+    xxhash = None
+
+logger = logging.getLogger(__name__)
+
+# Config sections that change analysis results (and so invalidate cached ones)
+FINGERPRINT_SECTIONS = ('biometrics', 'thresholds', 'detector', 'background', 'segmentation')
+
+# Format of cached payloads and the measurements in them. Bump whenever either
+# (or the checks producing them) changes, so entries of older builds in a
+# persistent cache are no longer served.
+# 2: payloads carry per-stage measurements
+CACHE_SCHEMA_VERSION = 2
+
+def content_hash(img):
+    """
+    Hash of the decoded pixels (plus shape/dtype), independent of the file
+    encoding or the array object. Hashes the buffer in place when contiguous.
+    """
+    buf = np.ascontiguousarray(img)
+    h = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    h.update(f"{buf.shape}{buf.dtype}".encode())
+    h.update(buf.data)
+    return h.hexdigest()
+
+def config_fingerprint(config):
+    relevant = {name: (config or {}).get(name) for name in FINGERPRINT_SECTIONS}
+    relevant['schema'] = CACHE_SCHEMA_VERSION
+    blob = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.blake2b(blob.encode(), digest_size=8).hexdigest()
+
+def _jsonable(o):
+    if isinstance(o, np.ndarray): return o.tolist()
+    if hasattr(o, 'item'): return o.item()
+    return str(o)
+
+class ResultCache:
+    """
+    Analysis results keyed by image content + config fingerprint.
+    Two tiers: an in-memory LRU and, with db_path, a SQLite file that
+    survives restarts and can be shared by batch worker processes.
+    Entries are stored as plain JSON-able payloads (meta, face bbox/kps,
+    stage results) and rebuilt on every hit, so callers can't alter them.
+    """
+    def __init__(self, fingerprint, max_entries=256, db_path=None):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results "
+                             "(key TEXT PRIMARY KEY, payload TEXT NOT NULL, created REAL NOT NULL)")
+            self._db.commit()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Cache for the 'cache' section of config.yaml, or None when disabled.
+        """
+        cache_cfg = (config or {}).get('cache', {}) or {}
+        if not cache_cfg.get('enabled', False):
+            return None
+        return cls(config_fingerprint(config),
+                   max_entries=cache_cfg.get('max_entries', 256),
+                   db_path=cache_cfg.get('db_path') or None)
+
+    def key(self, img):
+        return f"{self.fingerprint}:{content_hash(img)}"
+
+    def get(self, key):
+        """
+        Cached payload for key (a fresh copy), or None.
+        """
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                return copy.deepcopy(payload)
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            payload = json.loads(row[0])
+            self._remember(key, payload)
+            return copy.deepcopy(payload)
+
+    def put(self, key, payload):
+        # Round-trip through JSON: drops numpy types and detaches from the caller's objects
+        text = json.dumps(payload, default=_jsonable)
+        payload = json.loads(text)
+        with self._lock:
+            self._remember(key, payload)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO results (key, payload, created) VALUES (?, ?, ?)",
+                                     (key, text, time.time()))
+                    self._db.commit()
+                except sqlite3.Error:
+                    logger.warning("Could not store analysis result on disk", exc_info=True)
+
+    def _remember(self, key, payload):
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
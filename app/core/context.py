@@ -0,0 +1,106 @@
+import cv2
+
+def downscale_to(img, max_side):
+    """
+    Downscale so the longer side is at most max_side. Returns (image, scale);
+    the image itself and 1.0 if it is already small enough.
+    """
+    h, w = img.shape[:2]
+    scale = max_side / float(max(h, w))
+    if scale >= 1.0:
+        return img, 1.0
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+def masked_stats(img_bgr, gray, mask):
+    """
+    Single-pass statistics over the non-zero pixels of mask, computed without
+    copying the selected pixels out of the image.
+    Returns dict with 'count', per-channel 'mean_bgr'/'std_bgr' and 'mean_gray'/'std_gray'
+    (population std, like np.std).
+    """
+    count = cv2.countNonZero(mask)
+    if count == 0:
+        return {'count': 0, 'mean_bgr': None, 'std_bgr': None, 'mean_gray': None, 'std_gray': None}
+    mean_bgr, std_bgr = cv2.meanStdDev(img_bgr, mask=mask)
+    mean_gray, std_gray = cv2.meanStdDev(gray, mask=mask)
+    return {
+        'count': count,
+        'mean_bgr': mean_bgr.ravel(),
+        'std_bgr': std_bgr.ravel(),
+        'mean_gray': mean_gray[0][0],
+        'std_gray': std_gray[0][0],
+    }
+
+class AnalysisContext:
+    """
+    Per-image cache of derived buffers (gray, half-scale, RGB, Laplacian, proxies).
+    Each buffer is computed on first access and reused by every checker
+    during one Analyzer.analyze call. The source image must not be modified
+    while the context is alive.
+    """
+    def __init__(self, img_bgr):
+        self.image = img_bgr
+        self._cache = {}
+
+    @classmethod
+    def of(cls, img_bgr, ctx=None):
+        """
+        Return ctx if it belongs to img_bgr, otherwise a fresh context.
+        """
+        if ctx is not None and ctx.image is img_bgr:
+            return ctx
+        return cls(img_bgr)
+
+    def _memo(self, key, compute):
+        value = self._cache.get(key)
+        if value is None:
+            value = compute()
+            self._cache[key] = value
+        return value
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def gray(self):
+        return self._memo('gray', lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def rgb(self):
+        return self._memo('rgb', lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB))
+
+    @property
+    def half(self):
+        """
+        BGR image at 0.5 scale (used by the background flood fill).
+        """
+        return self._memo('half', lambda: cv2.resize(self.image, (0, 0), fx=0.5, fy=0.5))
+
+    @property
+    def half_gray(self):
+        return self._memo('half_gray', lambda: cv2.cvtColor(self.half, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def laplacian(self):
+        return self._memo('laplacian', lambda: cv2.Laplacian(self.gray, cv2.CV_64F))
+
+    def masked_stats(self, mask):
+        """
+        masked_stats() for this image, memoized per mask object so the
+        background and quality checkers share one pass over the same mask.
+        """
+        cached = self._cache.get('masked_stats')
+        if cached is not None and cached[0] is mask:
+            return cached[1]
+        stats = masked_stats(self.image, self.gray, mask)
+        self._cache['masked_stats'] = (mask, stats)
+        return stats
+
+    def proxy(self, max_side):
+        """
+        Downscaled copy whose longer side is at most max_side.
+        Returns (image, scale) as downscale_to().
+        """
+        return self._memo(('proxy', max_side), lambda: downscale_to(self.image, max_side))
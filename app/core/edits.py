@@ -0,0 +1,244 @@
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from app.core.context import downscale_to
+from app.core.geometry import DetectedFace
+from app.core.optimizer import ImageOptimizer, apply_adjustments
+
+# What an edit changes, i.e. which analysis inputs it invalidates
+PIXELS = 'pixels'     # Pixel values change, face position/size unchanged
+GEOMETRY = 'geometry' # Image coordinates change (crop, resize, rotate)
+
+# Which inputs each analysis stage depends on. Face detection is never
+# re-run for declared edits: landmarks are carried through the edit matrix.
+STAGE_DEPENDENCIES = {
+    'background': {PIXELS, GEOMETRY},
+    'quality': {PIXELS, GEOMETRY},
+    'geometry': {GEOMETRY},
+}
+
+class Edit:
+    """
+    Declares what an image edit invalidates.
+    matrix: 2x3 affine mapping old image coords to new ones (identity for pixel edits).
+    """
+    invalidates = frozenset([PIXELS])
+
+    def __init__(self, name="edit"):
+        self.name = name
+        self.matrix = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+    def stages(self):
+        """
+        Analysis stages that must be recomputed after this edit.
+        """
+        return {stage for stage, deps in STAGE_DEPENDENCIES.items() if deps & self.invalidates}
+
+    def inverse(self):
+        """
+        Declaration for undoing this edit (same invalidation, inverted matrix).
+        """
+        undo = Edit(f"undo {self.name}")
+        undo.invalidates = self.invalidates
+        undo.matrix = cv2.invertAffineTransform(self.matrix)
+        return undo
+
+    def render(self, img, scale, optimizer):
+        """
+        Apply the edit to img. scale is the resolution of img relative to the
+        coordinates the edit was declared in (< 1.0 for preview proxies).
+        Must return a new array and leave img untouched.
+        """
+        raise NotImplementedError
+
+class PixelEdit(Edit):
+    """
+    Tone/colour edits (brightness, background replacement): face stays put.
+    """
+    invalidates = frozenset([PIXELS])
+
+class AdjustEdit(PixelEdit):
+    """
+    Tonal adjustment (brightness, gamma, contrast, wb) applied as one LUT.
+    Consecutive adjustments are fused, so a run of them is always rendered
+    in a single pass from the image before the run.
+    """
+    def __init__(self, name="brightness", **params):
+        super().__init__(name)
+        self.params = params
+
+    def fuse(self, other):
+        params = dict(self.params)
+        for key, value in other.params.items():
+            if key == 'wb':
+                prev = params.get('wb', (1.0, 1.0, 1.0))
+                params['wb'] = tuple(a * b for a, b in zip(prev, value))
+            else:
+                params[key] = params.get(key, 1.0) * value
+        return AdjustEdit(f"{self.name}+{other.name}", **params)
+
+    def render(self, img, scale, optimizer):
+        out = apply_adjustments(img, **self.params)
+        return out.copy() if out is img else out
+
+class BackgroundEdit(PixelEdit):
+    """
+    Background replacement around the face at bbox (in the edit's input coords).
+    """
+    def __init__(self, bbox, name="background"):
+        super().__init__(name)
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+
+    def render(self, img, scale, optimizer):
+        out = optimizer.optimize_background(img, DetectedFace(self.bbox * scale))
+        return out.copy() if out is img else out
+
+class CropEdit(Edit):
+    """
+    Crop extracted with cv2.getRectSubPix(img, size, center).
+    """
+    invalidates = frozenset([PIXELS, GEOMETRY])
+
+    def __init__(self, center, size, name="crop"):
+        super().__init__(name)
+        self.center = center
+        self.size = size
+        # getRectSubPix: dst(x, y) = src(x + cx - (w-1)/2, y + cy - (h-1)/2)
+        self.matrix[0, 2] = -(center[0] - (size[0] - 1) * 0.5)
+        self.matrix[1, 2] = -(center[1] - (size[1] - 1) * 0.5)
+
+    def render(self, img, scale, optimizer):
+        if scale == 1.0:
+            return cv2.getRectSubPix(img, tuple(self.size), tuple(self.center))
+        size = (max(1, int(round(self.size[0] * scale))), max(1, int(round(self.size[1] * scale))))
+        # Pixel centres: proxy_x = (x + 0.5) * scale - 0.5
+        center = ((self.center[0] + 0.5) * scale - 0.5, (self.center[1] + 0.5) * scale - 0.5)
+        return cv2.getRectSubPix(img, size, center)
+
+def compose_edits(edits):
+    """
+    Combine consecutive edits (oldest first) into one equivalent declaration.
+    """
+    combined = Edit("+".join(e.name for e in edits))
+    invalidates = set()
+    M = np.eye(3)
+    for e in edits:
+        invalidates |= e.invalidates
+        M = np.vstack([e.matrix, [0, 0, 1]]) @ M
+    combined.invalidates = frozenset(invalidates)
+    combined.matrix = M[:2]
+    return combined
+
+class EditStack:
+    """
+    Non-destructive edit history over an immutable original.
+    Images are rendered lazily at two levels: 'preview' (a proxy whose longer
+    side is at most preview_max_side, for display) and 'full' (for analysis
+    and export). Intermediate results are memoized per edit prefix, so undo,
+    redo and re-applying a recent edit only render what is missing.
+    Each level has its own lock and optimizer, so a full-resolution render on
+    a worker thread does not block previews on the GUI thread.
+    """
+    MEMO_SIZE = {'preview': 32, 'full': 4}
+
+    def __init__(self, original, config=None, preview_max_side=1600):
+        self.original = original
+        self.ops = []
+        self._redo = []
+        proxy, self.preview_scale = downscale_to(original, preview_max_side)
+        self._levels = {
+            'preview': (proxy, self.preview_scale),
+            'full': (original, 1.0),
+        }
+        self._memo = {level: OrderedDict() for level in self._levels}
+        self._locks = {level: threading.Lock() for level in self._levels}
+        self._optimizers = {level: ImageOptimizer(config) for level in self._levels}
+
+    @classmethod
+    def from_config(cls, original, config):
+        edit_cfg = (config or {}).get('editing', {}) or {}
+        return cls(original, config, edit_cfg.get('preview_max_side', 1600))
+
+    def push(self, edit):
+        self.ops.append(edit)
+        self._redo = []
+
+    def undo(self):
+        """
+        Remove the last edit and return it (None if there is nothing to undo).
+        """
+        if not self.ops:
+            return None
+        edit = self.ops.pop()
+        self._redo.append(edit)
+        return edit
+
+    def redo(self):
+        if not self._redo:
+            return None
+        edit = self._redo.pop()
+        self.ops.append(edit)
+        return edit
+
+    def reset(self):
+        """
+        Drop all edits (not undoable). Memoized renders stay valid.
+        """
+        self.ops = []
+        self._redo = []
+
+    @property
+    def can_undo(self):
+        return bool(self.ops)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def preview(self):
+        return self.render_ops(tuple(self.ops), 'preview')
+
+    def render(self):
+        return self.render_ops(tuple(self.ops), 'full')
+
+    def snapshot(self):
+        """
+        Callable rendering the current edits at full resolution, for worker
+        threads (later pushes/undos do not affect it).
+        """
+        ops = tuple(self.ops)
+        return lambda: self.render_ops(ops, 'full')
+
+    def render_ops(self, ops, level):
+        base, scale = self._levels[level]
+        segments = _fuse_adjustments(ops)
+        memo = self._memo[level]
+        with self._locks[level]:
+            # Start from the longest memoized prefix
+            start, img = 0, base
+            for i in range(len(segments), 0, -1):
+                cached = memo.get(ops[:segments[i - 1][0]])
+                if cached is not None:
+                    memo.move_to_end(ops[:segments[i - 1][0]])
+                    start, img = i, cached
+                    break
+            
+            for end, edit in segments[start:]:
+                img = edit.render(img, scale, self._optimizers[level])
+                memo[ops[:end]] = img
+                while len(memo) > self.MEMO_SIZE[level]:
+                    memo.popitem(last=False)
+            return img
+
+def _fuse_adjustments(ops):
+    """
+    Split ops into (end index, edit) segments, fusing runs of AdjustEdits.
+    """
+    segments = []
+    for i, edit in enumerate(ops):
+        if segments and isinstance(edit, AdjustEdit) and isinstance(segments[-1][1], AdjustEdit):
+            segments[-1] = (i + 1, segments[-1][1].fuse(edit))
+        else:
+            segments.append((i + 1, edit))
+    return segments
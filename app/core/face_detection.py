@@ -1,33 +1,188 @@
-
+import threading
 import cv2
 import numpy as np
 import insightface
 from insightface.app import FaceAnalysis
+from app.core.context import AnalysisContext, downscale_to
+
+# Process-wide registry of prepared FaceAnalysis instances.
+# Key: (model_name, det_size, providers, allowed_modules) -> FaceAnalysis
+_MODEL_CACHE = {}
+_MODEL_LOCK = threading.Lock()
+
+# The Analyzer only reads bbox and the 5-point kps, which come from the detector.
+DETECTION_ONLY = ('detection',)
+
+def _model_key(model_name, det_size, providers, allowed_modules):
+    modules = tuple(sorted(allowed_modules)) if allowed_modules is not None else None
+    return (model_name, tuple(det_size), tuple(providers), modules)
+
+def get_face_analysis(model_name='buffalo_l', ctx_id=0, det_size=(640, 640), providers=('CPUExecutionProvider',),
+                      allowed_modules=None):
+    """
+    Return a shared, prepared FaceAnalysis for the given settings.
+    The ONNX models are loaded only once per process; later calls (other
+    Analyzers, worker threads) get the same instance. onnxruntime sessions
+    are safe to run concurrently, so the instance can be shared across threads.
+    :param allowed_modules: Restrict loaded models by task name (None = all of the pack)
+    """
+    key = _model_key(model_name, det_size, providers, allowed_modules)
+    app = _MODEL_CACHE.get(key)
+    if app is not None:
+        return app
+
+    with _MODEL_LOCK:
+        # Another thread may have loaded it while we were waiting
+        app = _MODEL_CACHE.get(key)
+        if app is None:
+            modules = list(allowed_modules) if allowed_modules is not None else None
+            app = FaceAnalysis(name=model_name, providers=list(providers), allowed_modules=modules)
+            app.prepare(ctx_id=ctx_id, det_size=tuple(det_size))
+            _MODEL_CACHE[key] = app
+        return app
+
+def evict_face_analysis(model_name=None, det_size=None, providers=None, allowed_modules=None):
+    """
+    Drop cached models so their memory can be reclaimed.
+    With no arguments the whole cache is cleared, otherwise only entries
+    matching every given field. Returns the number of evicted entries.
+    :param allowed_modules: Only entries loaded with exactly these modules (order ignored)
+    """
+    modules = tuple(sorted(allowed_modules)) if allowed_modules is not None else None
+    with _MODEL_LOCK:
+        keys = [k for k in _MODEL_CACHE
+                if (model_name is None or k[0] == model_name)
+                and (det_size is None or k[1] == tuple(det_size))
+                and (providers is None or k[2] == tuple(providers))
+                and (modules is None or k[3] == modules)]
+        for k in keys:
+            del _MODEL_CACHE[k]
+        return len(keys)
+
+# Face attributes holding image coordinates (x, y in the first two columns)
+_POINT_KEYS = ('kps', 'landmark_2d_106', 'landmark_3d_68')
+
+def _map_face(face, scale, offset_x=0.0, offset_y=0.0):
+    """
+    Map a face detected on a resized/cropped image back to source coordinates.
+    scale is (detection image size / source size), offset the crop origin in the source.
+    """
+    bbox = np.asarray(face.bbox, dtype=np.float32).copy()
+    bbox[[0, 2]] = bbox[[0, 2]] / scale + offset_x
+    bbox[[1, 3]] = bbox[[1, 3]] / scale + offset_y
+    face.bbox = bbox
+    for key in _POINT_KEYS:
+        pts = face.get(key)
+        if pts is None:
+            continue
+        pts = np.asarray(pts, dtype=np.float32).copy()
+        pts[:, 0] = pts[:, 0] / scale + offset_x
+        pts[:, 1] = pts[:, 1] / scale + offset_y
+        setattr(face, key, pts)
+    return face
+
+def _face_area(face):
+    return (face.bbox[2] - face.bbox[0]) * (face.bbox[3] - face.bbox[1])
 
 class FaceDetector:
-    def __init__(self, model_name='buffalo_l', ctx_id=0, det_size=(640, 640)):
+    def __init__(self, model_name='buffalo_l', ctx_id=0, det_size=(640, 640), detection_only=True,
+                 proxy_max_side=None, refine=False):
         """
-        Initialize InsightFace Analysis.
+        Initialize InsightFace Analysis (shared via the process-wide model cache).
         :param model_name: 'buffalo_l' (more accurate) or 'buffalo_sc' (faster)
         :param ctx_id: GPU index (-1 for CPU)
         :param det_size: Detection size
+        :param detection_only: Load only the RetinaFace/SCRFD detector and skip the
+                               recognition, genderage and landmark models
+        :param proxy_max_side: Detect on a downscaled proxy whose longer side is at most
+                               this many pixels (None = always use the full image)
+        :param refine: Re-detect the largest face on a face-centred full-resolution crop
+                       for more precise landmarks
+        """
+        allowed_modules = DETECTION_ONLY if detection_only else None
+        # Force CPU for compatibility
+        self.app = get_face_analysis(model_name, ctx_id, det_size, providers=('CPUExecutionProvider',),
+                                     allowed_modules=allowed_modules)
+        self.proxy_max_side = proxy_max_side
+        self.refine = refine
+        # Context of the most recent image; re-analysis of the same frame reuses its proxy
+        self._last_ctx = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a detector from the 'detector' section of config.yaml.
         """
-        self.app = FaceAnalysis(name=model_name, providers=['CPUExecutionProvider']) # Force CPU for compatibility
-        self.app.prepare(ctx_id=ctx_id, det_size=det_size)
+        det_cfg = config.get('detector', {}) or {}
+        return cls(model_name=det_cfg.get('model_name', 'buffalo_l'),
+                   det_size=tuple(det_cfg.get('det_size', (640, 640))),
+                   detection_only=det_cfg.get('detection_only', True),
+                   proxy_max_side=det_cfg.get('proxy_max_side'),
+                   refine=det_cfg.get('refine', False))
 
-    def detect_faces(self, img_path_or_array):
+    def get_proxy(self, img, ctx=None):
+        """
+        Return (proxy, scale) for detection, memoized on the analysis context.
+        """
+        if ctx is None or ctx.image is not img:
+            ctx = AnalysisContext.of(img, self._last_ctx)
+            self._last_ctx = ctx
+        return ctx.proxy(self.proxy_max_side)
+
+    def detect_faces(self, img_path_or_array, ctx=None):
         """
         Detect faces in an image.
         :param img_path_or_array: Path to image or numpy array (BGR)
+        :param ctx: Optional AnalysisContext of the image (shares the proxy buffer)
         :return: List of detected face objects
         """
         if isinstance(img_path_or_array, str):
             img = cv2.imread(img_path_or_array)
         else:
             img = img_path_or_array
-            
+
         if img is None:
             raise ValueError("Could not load image")
 
-        faces = self.app.get(img)
+        if not self.proxy_max_side:
+            return self.app.get(img), img
+
+        # Coarse pass on the proxy, mapped back to full-resolution coordinates
+        proxy, scale = self.get_proxy(img, ctx)
+        faces = self.app.get(proxy)
+        if scale != 1.0:
+            faces = [_map_face(f, scale) for f in faces]
+
+        if self.refine and faces and scale != 1.0:
+            faces = sorted(faces, key=_face_area, reverse=True)
+            faces[0] = self._refine_face(img, faces[0])
+
         return faces, img
+
+    def _refine_face(self, img, face):
+        """
+        Re-detect a face on a crop centred on its coarse bbox.
+        Falls back to the coarse face if the crop yields nothing.
+        """
+        h, w = img.shape[:2]
+        x1, y1, x2, y2 = face.bbox
+        # Face fills about a third of the crop, which suits the detector
+        pad_x = (x2 - x1)
+        pad_y = (y2 - y1)
+        cx1 = int(max(0, x1 - pad_x))
+        cy1 = int(max(0, y1 - pad_y))
+        cx2 = int(min(w, x2 + pad_x))
+        cy2 = int(min(h, y2 + pad_y))
+        if cx2 - cx1 < 2 or cy2 - cy1 < 2:
+            return face
+
+        crop, scale = downscale_to(img[cy1:cy2, cx1:cx2], self.proxy_max_side)
+        candidates = self.app.get(crop)
+        if not candidates:
+            return face
+
+        # Pick the candidate closest to the coarse face centre
+        coarse_c = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
+        candidates = [_map_face(f, scale, cx1, cy1) for f in candidates]
+        return min(candidates, key=lambda f: np.linalg.norm(
+            np.array([(f.bbox[0] + f.bbox[2]) / 2, (f.bbox[1] + f.bbox[3]) / 2]) - coarse_c))
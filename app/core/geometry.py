@@ -1,10 +1,39 @@
 
 import numpy as np
+from app.core.rules import resolve_limits, passes
+
+class DetectedFace:
+    """
+    Minimal face record (bbox, 5-point kps, score) with the same attribute
+    names as InsightFace faces. Used for faces derived without running the
+    detector (transformed through edits, restored from caches).
+    """
+    def __init__(self, bbox, kps=None, det_score=None):
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+        self.kps = np.asarray(kps, dtype=np.float32) if kps is not None else None
+        self.det_score = det_score
+
+def transform_face(face, matrix):
+    """
+    Map a face through a 2x3 affine matrix (old image -> new image coords).
+    The bbox becomes the axis-aligned box around the transformed corners.
+    """
+    M = np.asarray(matrix, dtype=np.float64)
+    x1, y1, x2, y2 = face.bbox[:4]
+    corners = np.array([[x1, y1], [x2, y1], [x1, y2], [x2, y2]], dtype=np.float64)
+    corners = corners @ M[:, :2].T + M[:, 2]
+    bbox = [corners[:, 0].min(), corners[:, 1].min(), corners[:, 0].max(), corners[:, 1].max()]
+    
+    kps = None
+    if face.kps is not None:
+        kps = np.asarray(face.kps, dtype=np.float64) @ M[:, :2].T + M[:, 2]
+    return DetectedFace(bbox, kps, getattr(face, 'det_score', None))
 
 class GeometryChecker:
     def __init__(self, config):
         self.config = config
         self.biometrics = config.get('biometrics', {})
+        self.limits = resolve_limits(config)
 
     def check_processed_image(self, face, img_height, img_width):
         """
@@ -14,19 +43,20 @@ class GeometryChecker:
         If we are checking a raw image, we simulate how it WOULD be cropped (centering on face).
         For strict BMI checking, we assume the face is centered horizontally.
         """
-        results = {}
-        
+        return self.evaluate(self.measure(face, img_height, img_width))
+
+    def measure(self, face, img_height, img_width):
+        """
+        Raw geometry metrics in mm (image height = 45mm); no thresholds applied.
+        """
         # Landmarks: [LeftEye, RightEye, Nose, LeftMouth, RightMouth]
         kps = face.kps
         if kps is None or len(kps) < 5:
-             results['meta'] = {'passed': False, 'msg': "Landmarks missing"}
-             return results
+             return {'landmarks': False}
 
         left_eye = kps[0]
         right_eye = kps[1]
         nose = kps[2]
-        mouth_l = kps[3]
-        mouth_r = kps[4]
         
         # Scaling factor: We assume the image IS 35mm x 45mm for these checks,
         # or we project pixel dimensions to mm based on image height = 45mm.
@@ -38,64 +68,73 @@ class GeometryChecker:
         # Metric: Bounding box height is a decent proxy for Chin-Crown if detection is tight.
         # Alternatively: Chin to Eye + Eye to Crown (Eye to Crown approx 1.618 * Eye to Chin?)
         # Let's use bbox height for now, but strict BMI requires "Chin line to Crown".
-        
         face_h_px = face.bbox[3] - face.bbox[1]
-        face_h_mm = face_h_px * px_to_mm
         
-        # Use new keys matching config.yaml
-        min_h = self.biometrics.get('face_height_min_mm', 30.0) 
-        max_h = self.biometrics.get('face_height_max_mm', 36.0)
+        # 2. Eye Position (Step 1: Augenbereich): average eye height from bottom
+        avg_eye_y = (left_eye[1] + right_eye[1]) / 2
+        eye_y_from_bottom_px = img_height - avg_eye_y
+        
+        # 4. Nose Center (Nasenmitte im Bereich): horizontal distance from the centre
+        img_center_x = img_width / 2
+        
+        # 5. Head Roll (Kopfhaltung gerade)
+        dx = right_eye[0] - left_eye[0]
+        dy = right_eye[1] - left_eye[1]
         
+        return {
+            'landmarks': True,
+            'face_height_mm': float(face_h_px * px_to_mm),
+            'eye_y_from_bottom_mm': float(eye_y_from_bottom_px * px_to_mm),
+            # 3. Eyes Level (Waagerecht) - "Augen auf gleicher Höhe"
+            'eye_diff_mm': float(abs(left_eye[1] - right_eye[1]) * px_to_mm),
+            'nose_dist_mm': float(abs(nose[0] - img_center_x) * px_to_mm),
+            'roll_deg': float(np.degrees(np.arctan2(dy, dx))),
+        }
+
+    def evaluate(self, m):
+        """
+        Pass/fail results for measure() output against the configured limits.
+        """
+        results = {}
+        L = self.limits
+        if not passes('geometry', 'landmarks', m, L):
+             results['meta'] = {'passed': False, 'msg': "Landmarks missing"}
+             return results
+
         # BMI Step 2: Face Size
-        if min_h <= face_h_mm <= max_h:
+        face_h_mm = m['face_height_mm']
+        min_h, max_h = L['face_height_min_mm'], L['face_height_max_mm']
+        if passes('geometry', 'face_height', m, L):
             results['face_height'] = {'passed': True, 'value': f"{face_h_mm:.1f}mm", 'msg': f"OK ({min_h}-{max_h}mm)"}
         else:
             results['face_height'] = {'passed': False, 'value': f"{face_h_mm:.1f}mm", 
                                       'msg': f"Height must be {min_h}-{max_h}mm"}
 
-        # 2. Eye Position (Step 1: Augenbereich)
         # Eyes must be in gray area.
-        # Height from bottom.
-        # Average eye Y.
-        avg_eye_y = (left_eye[1] + right_eye[1]) / 2
-        eye_y_from_bottom_px = img_height - avg_eye_y
-        eye_y_from_bottom_mm = eye_y_from_bottom_px * px_to_mm
-        
-        min_eye = self.biometrics.get('min_eye_y_from_bottom_mm', 21.8)
-        max_eye = self.biometrics.get('max_eye_y_from_bottom_mm', 29.7)
-        
-        if min_eye <= eye_y_from_bottom_mm <= max_eye:
+        eye_y_from_bottom_mm = m['eye_y_from_bottom_mm']
+        min_eye, max_eye = L['min_eye_y_from_bottom_mm'], L['max_eye_y_from_bottom_mm']
+        if passes('geometry', 'eye_position', m, L):
              results['eye_position'] = {'passed': True, 'value': f"{eye_y_from_bottom_mm:.1f}mm", 'msg': "OK (In Zone)"}
         else:
              results['eye_position'] = {'passed': False, 'value': f"{eye_y_from_bottom_mm:.1f}mm", 
                                         'msg': f"Eyes outside zone ({min_eye}-{max_eye}mm)"}
 
-        # 3. Eyes Level (Waagerecht) - "Augen auf gleicher Höhe"
-        eye_diff_y = abs(left_eye[1] - right_eye[1])
-        eye_diff_mm = eye_diff_y * px_to_mm
-        if eye_diff_mm < 1.0: # 1mm tolerance
+        # 1mm tolerance
+        eye_diff_mm = m['eye_diff_mm']
+        if passes('geometry', 'eyes_level', m, L):
              results['eyes_level'] = {'passed': True, 'value': f"{eye_diff_mm:.1f}mm", 'msg': "Level"}
         else:
              results['eyes_level'] = {'passed': False, 'value': f"{eye_diff_mm:.1f}mm", 'msg': "Tilted"}
 
-        # 4. Nose Center (Nasenmitte im Bereich)
         # Should be horizontally centered.
-        img_center_x = img_width / 2
-        nose_dist_x = abs(nose[0] - img_center_x)
-        nose_dist_mm = nose_dist_x * px_to_mm
-        
-        max_dev = self.biometrics.get('max_center_deviation_mm', 2.5)
-        
-        if nose_dist_mm <= max_dev:
+        nose_dist_mm = m['nose_dist_mm']
+        if passes('geometry', 'nose_center', m, L):
              results['nose_center'] = {'passed': True, 'value': f"{nose_dist_mm:.1f}mm", 'msg': "Centered"}
         else:
              results['nose_center'] = {'passed': False, 'value': f"{nose_dist_mm:.1f}mm", 'msg': "Off-center"}
 
-        # 5. Head Roll (Kopfhaltung gerade)
-        dx = right_eye[0] - left_eye[0]
-        dy = right_eye[1] - left_eye[1]
-        angle = np.degrees(np.arctan2(dy, dx))
-        if abs(angle) < 5:
+        angle = m['roll_deg']
+        if passes('geometry', 'roll', m, L):
             results['roll'] = {'passed': True, 'value': f"{angle:.1f}°", 'msg': "Straight"}
         else:
              results['roll'] = {'passed': False, 'value': f"{angle:.1f}°", 'msg': "Tilted"}
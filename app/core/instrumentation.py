@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import logging
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Shared no-op objects handed out while instrumentation is disabled,
+# so the hot path costs one attribute lookup and an empty with-block
+_NULL_STAGE = nullcontext()
+
+class _NullRun:
+    timings = None
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+_NULL_RUN = _NullRun()
+
+# tracemalloc's peak is process-wide: with trace_memory, stages of concurrent
+# runs (analysis service + live guidance) take turns so none resets or
+# inflates another's peak_kb. Reentrant for stages nested in one thread.
+_TRACE_LOCK = threading.RLock()
+
+class _Stage:
+    def __init__(self, run, name):
+        self.run = run
+        self.name = name
+
+    def __enter__(self):
+        if self.run.trace_memory:
+            _TRACE_LOCK.acquire()
+            tracemalloc.reset_peak()
+            self._mem0 = tracemalloc.get_traced_memory()[0]
+        self._cpu0 = time.thread_time()
+        self._wall0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall0
+        cpu = time.thread_time() - self._cpu0
+        entry = {'wall_ms': round(wall * 1000.0, 3), 'cpu_ms': round(cpu * 1000.0, 3)}
+        if self.run.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            _TRACE_LOCK.release()
+            entry['peak_kb'] = round(max(0, peak - self._mem0) / 1024.0, 1)
+        self.run.timings[self.name] = entry
+        return False
+
+class ProfileRun:
+    """
+    Timings of one analysis: {stage: {'wall_ms', 'cpu_ms'[, 'peak_kb']}}.
+    CPU time is per thread, so concurrent analyses don't count each other.
+    Memory-traced stages are serialized across threads instead (the peak
+    is process-wide), which slows concurrent analyses while tracing.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.timings = {}
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def total_ms(self):
+        return round((time.perf_counter() - self._start) * 1000.0, 3)
+
+class Profiler:
+    """
+    Per-stage wall/CPU time and (optionally) peak allocation via tracemalloc.
+    Usage:
+        run = profiler.begin()
+        with run.stage('detection'): ...
+        profiler.finish(run)
+    Finished runs are passed to every sink (see LogSink, JsonLinesSink,
+    HistogramSink). When disabled, begin() returns a shared no-op run.
+    """
+    def __init__(self, enabled=False, trace_memory=False, sinks=None):
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.sinks = list(sinks or [])
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a profiler from the 'instrumentation' section of config.yaml.
+        """
+        cfg = (config or {}).get('instrumentation', {}) or {}
+        if not cfg.get('enabled', False):
+            return cls(enabled=False)
+        sinks = []
+        for name in cfg.get('sinks', []) or []:
+            if name == 'log':
+                sinks.append(LogSink())
+            elif name == 'jsonl':
+                sinks.append(JsonLinesSink(cfg.get('jsonl_path', 'logs/timings.jsonl')))
+            elif name == 'histogram':
+                sinks.append(HistogramSink())
+            else:
+                raise ValueError(f"Unknown instrumentation sink: {name}")
+        return cls(enabled=True, trace_memory=cfg.get('trace_memory', False), sinks=sinks)
+
+    def begin(self):
+        if not self.enabled:
+            return _NULL_RUN
+        return ProfileRun(self.trace_memory)
+
+    def finish(self, run, **fields):
+        """
+        Close a run: add 'total' and hand the timings to the sinks.
+        Extra fields (e.g. image size) are passed along to the sinks.
+        Returns the timings dict (None when disabled).
+        """
+        if run is _NULL_RUN:
+            return None
+        run.timings['total'] = {'wall_ms': run.total_ms()}
+        for sink in self.sinks:
+            sink.record(run.timings, fields)
+        return run.timings
+
+    def histogram(self):
+        """
+        The first HistogramSink, if one is configured.
+        """
+        for sink in self.sinks:
+            if isinstance(sink, HistogramSink):
+                return sink
+        return None
+
+class LogSink:
+    """
+    One DEBUG line per analysis on the 'app.core.instrumentation' logger.
+    """
+    def __init__(self, log=None, level=logging.DEBUG):
+        self.log = log or logger
+        self.level = level
+
+    def record(self, timings, fields):
+        if self.log.isEnabledFor(self.level):
+            self.log.log(self.level, "stage timings %s %s", fields, timings)
+
+class JsonLinesSink:
+    """
+    Appends {'ts', ...fields, 'timings'} as one JSON line per analysis.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def record(self, timings, fields):
+        line = json.dumps(dict(fields, ts=round(time.time(), 3), timings=timings), default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+class HistogramSink:
+    """
+    In-memory wall-time histogram per stage (fixed millisecond buckets).
+    """
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self, buckets_ms=BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        # stage -> counts per bucket (last one: above the largest bound)
+        self._counts = defaultdict(lambda: [0] * (len(self.buckets_ms) + 1))
+        self._sums = defaultdict(float)
+        self._max = defaultdict(float)
+
+    def record(self, timings, fields):
+        with self._lock:
+            for stage, entry in timings.items():
+                ms = entry['wall_ms']
+                index = next((i for i, bound in enumerate(self.buckets_ms) if ms <= bound), len(self.buckets_ms))
+                self._counts[stage][index] += 1
+                self._sums[stage] += ms
+                self._max[stage] = max(self._max[stage], ms)
+
+    def summary(self):
+        """
+        {stage: {'count', 'mean_ms', 'max_ms', 'p50_ms', 'p95_ms', 'buckets'}}.
+        Percentiles are bucket upper bounds (None above the largest bucket).
+        """
+        with self._lock:
+            out = {}
+            for stage, counts in self._counts.items():
+                total = sum(counts)
+                out[stage] = {
+                    'count': total,
+                    'mean_ms': round(self._sums[stage] / total, 3),
+                    'max_ms': self._max[stage],
+                    'p50_ms': self._percentile(counts, total, 0.50),
+                    'p95_ms': self._percentile(counts, total, 0.95),
+                    'buckets': dict(zip([f"<={b}" for b in self.buckets_ms] + [f">{self.buckets_ms[-1]}"], counts)),
+                }
+            return out
+
+    def _percentile(self, counts, total, q):
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= q * total:
+                return self.buckets_ms[i] if i < len(self.buckets_ms) else None
+        return None
@@ -0,0 +1,89 @@
+import json
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+
+# Id of the image currently being analyzed (per thread / asyncio task)
+_correlation_id = contextvars.ContextVar('correlation_id', default=None)
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'correlation_id'}
+
+def get_correlation_id():
+    return _correlation_id.get()
+
+@contextmanager
+def correlation(cid=None):
+    """
+    Tag all log records emitted inside the block with a correlation id.
+    Without cid, an already active id is kept (nested calls, e.g. the batch
+    runner naming the image and Analyzer.run) or a new random one is made.
+    """
+    if cid is None and _correlation_id.get() is not None:
+        yield _correlation_id.get()
+        return
+    token = _correlation_id.set(str(cid) if cid is not None else uuid.uuid4().hex[:12])
+    try:
+        yield _correlation_id.get()
+    finally:
+        _correlation_id.reset(token)
+
+class CorrelationFilter(logging.Filter):
+    def filter(self, record):
+        record.correlation_id = _correlation_id.get() or '-'
+        return True
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per record: ts, level, logger, correlation_id, msg, any
+    extra= fields and the formatted exception. The message is only
+    interpolated here, i.e. for records that are actually emitted.
+    """
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s"
+
+# Handler installed by configure_logging (replaced on reconfiguration)
+_handler = None
+
+def configure_logging(config=None, stream=None):
+    """
+    Set up the 'app' logger from the 'app' section of config.yaml:
+    log_level (default INFO), log_format ('text' or 'json' lines) and
+    log_file (default: stderr). Safe to call again, e.g. in worker processes.
+    """
+    global _handler
+    app_cfg = (config or {}).get('app', {}) or {}
+    logger = logging.getLogger('app')
+    logger.setLevel(str(app_cfg.get('log_level', 'INFO')).upper())
+
+    if app_cfg.get('log_file'):
+        handler = logging.FileHandler(app_cfg['log_file'], encoding='utf-8')
+    else:
+        handler = logging.StreamHandler(stream)
+    if app_cfg.get('log_format', 'text') == 'json':
+        handler.setFormatter(JsonLinesFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handler.addFilter(CorrelationFilter())
+
+    if _handler is not None:
+        logger.removeHandler(_handler)
+        _handler.close()
+    logger.addHandler(handler)
+    _handler = handler
+    return logger
@@ -1,10 +1,56 @@
 
+from functools import lru_cache
 import cv2
 import numpy as np
+from app.core.context import downscale_to
+from app.core.segmentation import get_segmenter
+
+_IDENTITY_WB = (1.0, 1.0, 1.0)
+
+@lru_cache(maxsize=64)
+def build_lut(brightness=1.0, gamma=1.0, contrast=1.0, wb=_IDENTITY_WB):
+    """
+    Fused 256-entry lookup table (1x256x3, BGR) for the tonal adjustments,
+    memoized by parameters. Applied per channel in this order:
+    white balance gain (wb, BGR) -> gamma (brightness * gamma, >1 brighter)
+    -> contrast around mid-gray. The returned table is read-only.
+    """
+    v = np.arange(256, dtype=np.float64) / 255.0
+    gains = np.asarray(wb, dtype=np.float64).reshape(3, 1)
+    x = np.clip(v[np.newaxis, :] * gains, 0.0, 1.0)
+    # Using Gamma correction for nicer results than linear addition
+    x = x ** (1.0 / (brightness * gamma))
+    x = (x - 0.5) * contrast + 0.5
+    table = np.clip(np.rint(x * 255.0), 0, 255).astype(np.uint8).T.reshape(1, 256, 3)
+    table.setflags(write=False)
+    return table
+
+def _lut_key(value):
+    # Cumulative factors (1.1 * 0.9 * ...) land on nearby floats; round for cache hits
+    return round(float(value), 4)
+
+def apply_adjustments(img_bgr, brightness=1.0, gamma=1.0, contrast=1.0, wb=_IDENTITY_WB):
+    """
+    Apply all tonal adjustments in a single cv2.LUT pass. Always start from
+    the unadjusted image and pass the cumulative parameters, so repeated
+    edits do not compound rounding loss. Returns img_bgr itself for the
+    identity adjustment.
+    """
+    params = (_lut_key(brightness), _lut_key(gamma), _lut_key(contrast), tuple(_lut_key(g) for g in wb))
+    if params == (1.0, 1.0, 1.0, _IDENTITY_WB):
+        return img_bgr
+    return cv2.LUT(img_bgr, build_lut(*params))
 
 class ImageOptimizer:
     def __init__(self, config=None):
         self.config = config
+        self.opt_cfg = (config or {}).get('optimizer', {})
+        # Shared with BackgroundChecker: the matte of an analyzed image is reused
+        self.segmenter = get_segmenter(config)
+        # Using (220, 220, 220) - Distinctly light gray
+        self.background_color = tuple(self.opt_cfg.get('background_color', (220, 220, 220)))
+        self._buffers = {}
+        self._bg_color = None
 
     def optimize(self, img_bgr, face):
         """
@@ -18,19 +64,85 @@ class ImageOptimizer:
         factor > 1.0: Brighter
         factor < 1.0: Darker
         """
-        # Using Gamma correction for nicer results than linear addition
         # Reasonable range for factor: 0.5 to 1.5
-        invGamma = 1.0 / factor
-        table = np.array([((i / 255.0) ** invGamma) * 255
-                          for i in np.arange(0, 256)]).astype("uint8")
-        
-        return cv2.LUT(img_bgr, table)
+        return apply_adjustments(img_bgr, brightness=factor)
+
+    def apply_adjustments(self, img_bgr, adjustments):
+        """
+        Apply a dict of adjustments (brightness, gamma, contrast, wb) to the
+        unadjusted image in one LUT pass. See apply_adjustments().
+        """
+        return apply_adjustments(img_bgr, **adjustments)
 
     def optimize_background(self, img, face):
         """
         Uses GrabCut with strict mask initialization to protect dark clothing.
+        In 'multires' mode (default) GrabCut runs on a downscaled person ROI and
+        the mask is upsampled with edge refinement; 'full' runs on the whole image.
+        A configured segmentation model replaces GrabCut entirely.
         """
+        if self.segmenter is not None:
+            alpha = self.segmenter.segment(img)
+        elif self.opt_cfg.get('background_mode', 'multires') == 'full':
+            mask2 = self._grabcut_full(img, face.bbox)
+            alpha = None if mask2 is None else mask2.astype(np.float32)
+        else:
+            alpha = self.foreground_alpha(img, face.bbox)
+        if alpha is None:
+            return img
+        
+        # Post-Process Matte to fill holes (white streaks in hair)
+        # Morphological Close: Dilation followed by Erosion
+        # (into a reusable buffer; the segmenter's cached matte stays untouched)
         h, w = img.shape[:2]
+        kernel_size = max(3, int(w * 0.005)) # Dynamic kernel size
+        kernel = np.ones((kernel_size, kernel_size), np.uint8)
+        alpha = cv2.morphologyEx(alpha, cv2.MORPH_CLOSE, kernel, dst=self._buffer('alpha', (h, w), np.float32))
+        
+        # 6. Apply White Background (Light Gray)
+        # BMI recommends neutral light background (gray is often better than pure white for contrast)
+        return self.composite(img, alpha)
+
+    def composite(self, img, alpha, color=None, out=None):
+        """
+        Blend img over a solid color with a soft alpha matte (float32, 0..1):
+        out = img * alpha + color * (1 - alpha).
+        The background plane and inverse alpha live in buffers reused across
+        calls of the same size. Not thread-safe (one optimizer per thread).
+        :param color: BGR background, default optimizer.background_color
+        :param out: Optional destination (must not be shared with the caller's history)
+        """
+        h, w = img.shape[:2]
+        color = tuple(int(c) for c in (color if color is not None else self.background_color))
+        
+        bg = self._buffer('bg', (h, w, 3), np.uint8)
+        if self._bg_color != (color, bg.shape):
+            bg[:] = color
+            self._bg_color = (color, bg.shape)
+        
+        inv_alpha = self._buffer('inv_alpha', (h, w), np.float32)
+        np.subtract(1.0, alpha, out=inv_alpha)
+        
+        if out is None:
+            out = np.empty_like(img)
+        return cv2.blendLinear(img, bg, alpha, inv_alpha, dst=out)
+
+    def _buffer(self, name, shape, dtype):
+        """
+        Preallocated scratch buffer, reallocated only when the size changes.
+        """
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype)
+            self._buffers[name] = buf
+            if name == 'bg':
+                self._bg_color = None
+        return buf
+
+    def _init_grabcut_mask(self, h, w, bbox):
+        """
+        GrabCut seed layout for an image of size (h, w) with the face at bbox.
+        """
         mask = np.zeros((h, w), np.uint8)
         
         # 0. Initialize Layout
@@ -52,7 +164,7 @@ class ImageOptimizer:
         cv2.rectangle(mask, (w - margin_w, 0), (w, margin_h), cv2.GC_BGD, -1) # Top-Right
         
         # 2. Define "Sure Foreground" (Face)
-        box = face.bbox.astype(int)
+        box = np.asarray(bbox).astype(int)
         x1, y1, x2, y2 = box
         
         # Face ellipse as SURE Foreground
@@ -87,32 +199,102 @@ class ImageOptimizer:
         # (Already implicit if default is PR_FGD? No default is PR_BGD)
         # Let's set the wider body box as PR_FGD
         cv2.rectangle(mask, (body_x1, body_y1), (body_x2, body_y2), cv2.GC_PR_FGD, -1)
+        return mask
 
-        # 4. Run GrabCut
+    def _run_grabcut(self, img, mask):
+        """
+        Run GrabCut in place on mask; returns the binary (0/1) foreground or None.
+        """
         bgdModel = np.zeros((1, 65), np.float64)
         fgdModel = np.zeros((1, 65), np.float64)
         
         try:
             cv2.grabCut(img, mask, None, bgdModel, fgdModel, 5, cv2.GC_INIT_WITH_MASK)
         except Exception:
-            return img
+            return None
         
-        # 5. Create Final Mask
         # Pixels 0 and 2 are background
-        mask2 = np.where((mask==2)|(mask==0), 0, 1).astype('uint8')
+        return np.where((mask==2)|(mask==0), 0, 1).astype('uint8')
+
+    def _grabcut_full(self, img, bbox):
+        h, w = img.shape[:2]
+        return self._run_grabcut(img, self._init_grabcut_mask(h, w, bbox))
+
+    def foreground_alpha(self, img, bbox):
+        """
+        Multi-resolution foreground matte (float32, 0..1, full image size).
+        GrabCut runs on a downscaled copy of the person ROI; the mask is
+        upsampled and refined with a guided filter along the boundary band only.
+        Everything above the ROI is background.
+        """
+        h, w = img.shape[:2]
+        x1, y1, x2, y2 = np.asarray(bbox, dtype=np.float64)[:4]
+        fw, fh = x2 - x1, y2 - y1
         
-        # Post-Process Mask to fill holes (white streaks in hair)
-        # Morphological Close: Dilation followed by Erosion
-        kernel_size = max(3, int(w * 0.005)) # Dynamic kernel size
-        kernel = np.ones((kernel_size, kernel_size), np.uint8)
-        mask2 = cv2.morphologyEx(mask2, cv2.MORPH_CLOSE, kernel)
+        # Person ROI: from the hair down, full width (shoulders and clothing
+        # can reach the image edges, however narrow the face is)
+        rx1 = 0
+        rx2 = w
+        ry1 = int(max(0, y1 - fh * 0.75))
+        ry2 = h
+        if rx2 - rx1 < 8 or ry2 - ry1 < 8:
+            return None
+        roi = img[ry1:ry2, rx1:rx2]
+        rh, rw = roi.shape[:2]
         
-        # 6. Apply White Background (Light Gray)
-        # BMI recommends neutral light background (gray is often better than pure white for contrast)
-        # Using (220, 220, 220) - Distinctly light gray
-        white_bg = np.ones_like(img, dtype=np.uint8) * 220
-        img_fg = img * mask2[:, :, np.newaxis]
-        bg_part = white_bg * (1 - mask2[:, :, np.newaxis])
+        # GrabCut on the downscaled ROI
+        max_side = self.opt_cfg.get('grabcut_max_side', 480)
+        small, scale = downscale_to(roi, max_side)
+        sh, sw = small.shape[:2]
+        small_bbox = [(x1 - rx1) * scale, (y1 - ry1) * scale, (x2 - rx1) * scale, (y2 - ry1) * scale]
+        fg_small = self._run_grabcut(small, self._init_grabcut_mask(sh, sw, small_bbox))
+        if fg_small is None:
+            return None
+        
+        alpha_roi = fg_small.astype(np.float32)
+        if scale < 1.0:
+            alpha_roi = cv2.resize(alpha_roi, (rw, rh), interpolation=cv2.INTER_LINEAR)
+            alpha_roi = self._refine_edges(roi, alpha_roi, scale)
         
-        final = cv2.add(img_fg, bg_part)
-        return final
+        alpha = np.zeros((h, w), np.float32)
+        alpha[ry1:ry2, rx1:rx2] = alpha_roi
+        return alpha
+
+    def _refine_edges(self, img, alpha, scale):
+        """
+        Guided-filter refinement of an upsampled matte, restricted to the band
+        where the upsampled mask is neither 0 nor 1 (plus the filter radius).
+        """
+        radius = max(2, int(round(1.0 / scale)))
+        band = ((alpha > 0.0) & (alpha < 1.0)).astype(np.uint8)
+        if not band.any():
+            return alpha
+        band = cv2.dilate(band, np.ones((2 * radius + 1, 2 * radius + 1), np.uint8))
+        
+        # Only filter the bounding box of the band (plus the filter window)
+        bx, by, bw, bh = cv2.boundingRect(band)
+        h, w = alpha.shape
+        x1, y1 = max(0, bx - radius), max(0, by - radius)
+        x2, y2 = min(w, bx + bw + radius), min(h, by + bh + radius)
+        
+        guide = cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY).astype(np.float32) / 255.0
+        refined = _guided_filter(guide, alpha[y1:y2, x1:x2], radius, 1e-3)
+        np.clip(refined, 0.0, 1.0, out=refined)
+        
+        sub = alpha[y1:y2, x1:x2]
+        in_band = band[y1:y2, x1:x2].astype(bool)
+        sub[in_band] = refined[in_band]
+        return alpha
+
+def _guided_filter(guide, src, radius, eps):
+    """
+    Gray-guided filter (He et al.) built from box filters, O(pixels).
+    """
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    mean_i = cv2.boxFilter(guide, cv2.CV_32F, ksize)
+    mean_p = cv2.boxFilter(src, cv2.CV_32F, ksize)
+    corr_ip = cv2.boxFilter(guide * src, cv2.CV_32F, ksize)
+    var_i = cv2.boxFilter(guide * guide, cv2.CV_32F, ksize) - mean_i * mean_i
+    a = (corr_ip - mean_i * mean_p) / (var_i + eps)
+    b = mean_p - a * mean_i
+    return cv2.boxFilter(a, cv2.CV_32F, ksize) * guide + cv2.boxFilter(b, cv2.CV_32F, ksize)
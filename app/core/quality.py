@@ -1,27 +1,34 @@
 
+import logging
 import cv2
 import numpy as np
+from app.core.context import AnalysisContext
+from app.core.rules import resolve_limits, passes
+
+logger = logging.getLogger(__name__)
 
 class QualityChecker:
     def __init__(self, config):
         self.config = config
         self.thresholds = config.get('thresholds', {})
+        self.limits = resolve_limits(config)
 
-    def check_quality(self, img_bgr, bg_mask=None):
+    def check_quality(self, img_bgr, bg_mask=None, ctx=None):
         """
         Check technical quality of the image.
         """
-        results = {}
-        gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+        return self.evaluate(self.measure(img_bgr, bg_mask=bg_mask, ctx=ctx))
+
+    def measure(self, img_bgr, bg_mask=None, ctx=None):
+        """
+        Raw quality metrics (blur variance, histogram ratios, contrast,
+        background uniformity score); no thresholds applied.
+        """
+        ctx = AnalysisContext.of(img_bgr, ctx)
+        gray = ctx.gray
         
         # 1. Blur Detection (Laplacian Variance)
-        blur_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        min_blur = self.thresholds.get('blur_min_score', 100.0)
-        
-        if blur_var < min_blur:
-            results['blur'] = {'passed': False, 'value': float(round(blur_var, 2)), 'msg': "Blurry"}
-        else:
-             results['blur'] = {'passed': True, 'value': float(round(blur_var, 2)), 'msg': "Sharp"}
+        blur_var = ctx.laplacian.var()
 
         # 2. Exposure / Histogram
         # Simple check: is histogram spread okay?
@@ -33,20 +40,9 @@ class QualityChecker:
         # Check extremes
         dark_ratio = np.sum(hist_norm[:20]) # Shadows
         bright_ratio = np.sum(hist_norm[230:]) # Highlights
-        
-        if dark_ratio > 0.5:
-             results['exposure'] = {'passed': False, 'value': "Dark", 'msg': "Underexposed"}
-        elif bright_ratio > 0.5:
-             results['exposure'] = {'passed': False, 'value': "Bright", 'msg': "Overexposed"}
-        else:
-             results['exposure'] = {'passed': True, 'value': "OK", 'msg': "Good Exposure"}
              
         # 3. Contrast (Std Dev of gray)
         contrast = gray.std()
-        if contrast < 30:
-             results['contrast'] = {'passed': False, 'value': float(round(contrast, 2)), 'msg': "Low Contrast"}
-        else:
-             results['contrast'] = {'passed': True, 'value': float(round(contrast, 2)), 'msg': "OK"}
              
         # 4. Illumination / Shadows
         # Split image into left and right halves (approx) to check symmetry
@@ -56,16 +52,13 @@ class QualityChecker:
              if len(bg_mask.shape) > 2:
                  bg_mask = cv2.cvtColor(bg_mask, cv2.COLOR_BGR2GRAY)
              
-             mean, stddev = cv2.meanStdDev(gray, mask=bg_mask)
-             std_val = stddev[0][0]
+             # Shared with the background check when it is the same mask
+             std_val = ctx.masked_stats(bg_mask)['std_gray'] or 0.0
         else:
              # Fallback: Check corners
+             # Top 15% (rows 0..h*0.15 inclusive), taken as a view instead of a mask
              h, w = gray.shape
-             adhoc_mask = np.zeros_like(gray)
-             # Top 15%
-             cv2.rectangle(adhoc_mask, (0,0), (w, int(h*0.15)), 255, -1)
-             
-             mean, stddev = cv2.meanStdDev(gray, mask=adhoc_mask)
+             mean, stddev = cv2.meanStdDev(gray[:int(h*0.15) + 1])
              std_val = stddev[0][0]
         
         # Score: 100 - std_val
@@ -73,15 +66,45 @@ class QualityChecker:
         # Slight shadows/gradients cause this.
         score = max(0, 100 - std_val)
         
-        # Check thresholds first, then biometrics, then default
-        threshold = self.config.get('thresholds', {}).get('uniformity_min_score')
-        if threshold is None:
-             threshold = self.config.get('biometrics', {}).get('uniformity_min_score', 75.0)
+        return {
+            'blur_var': float(blur_var),
+            'dark_ratio': float(dark_ratio),
+            'bright_ratio': float(bright_ratio),
+            'contrast': float(contrast),
+            'uniformity_score': float(score),
+        }
+
+    def evaluate(self, m):
+        """
+        Pass/fail results for measure() output against the configured thresholds.
+        """
+        results = {}
+        L = self.limits
+        
+        blur_var = m['blur_var']
+        if passes('quality', 'blur', m, L):
+             results['blur'] = {'passed': True, 'value': float(round(blur_var, 2)), 'msg': "Sharp"}
+        else:
+            results['blur'] = {'passed': False, 'value': float(round(blur_var, 2)), 'msg': "Blurry"}
+
+        if passes('quality', 'exposure', m, L):
+             results['exposure'] = {'passed': True, 'value': "OK", 'msg': "Good Exposure"}
+        elif m['dark_ratio'] > L['max_dark_ratio']:
+             results['exposure'] = {'passed': False, 'value': "Dark", 'msg': "Underexposed"}
+        else:
+             results['exposure'] = {'passed': False, 'value': "Bright", 'msg': "Overexposed"}
+             
+        contrast = m['contrast']
+        if passes('quality', 'contrast', m, L):
+             results['contrast'] = {'passed': True, 'value': float(round(contrast, 2)), 'msg': "OK"}
+        else:
+             results['contrast'] = {'passed': False, 'value': float(round(contrast, 2)), 'msg': "Low Contrast"}
         
-        # DEBUG PRINT
-        print(f"DEBUG_UNIFORMITY: Score={score:.2f}, Threshold={threshold}, CONFIG_THRESHOLDS={self.config.get('thresholds')}")
+        score = m['uniformity_score']
+        threshold = L['uniformity_min_score']
+        logger.debug("uniformity score=%.2f threshold=%s", score, threshold)
 
-        if score >= threshold:
+        if passes('quality', 'uniformity', m, L):
             results['uniformity'] = {'passed': True, 'value': f"{score:.1f}", 'msg': f"Uniform (>={threshold})"}
         else:
             results['uniformity'] = {'passed': False, 'value': f"{score:.1f}", 
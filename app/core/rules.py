@@ -0,0 +1,166 @@
+import numpy as np
+
+# Order in which stage results are merged into the report (later keys win)
+STAGE_ORDER = ('background', 'quality', 'geometry')
+
+# Background limits (global and per tile), overridable in config 'background'
+MAX_BG_STD = 40        # Uniformity: max std dev of background pixels
+MIN_BG_BRIGHTNESS = 150  # Brightness: min mean of background pixels
+
+def resolve_limits(config):
+    """
+    All pass/fail thresholds, with the defaults the checkers have always used.
+    """
+    config = config or {}
+    bio = config.get('biometrics', {}) or {}
+    thr = config.get('thresholds', {}) or {}
+    bg = config.get('background', {}) or {}
+    # Check thresholds first, then biometrics, then default
+    uniformity = thr.get('uniformity_min_score')
+    if uniformity is None:
+        uniformity = bio.get('uniformity_min_score', 75.0)
+    return {
+        'face_height_min_mm': bio.get('face_height_min_mm', 30.0),
+        'face_height_max_mm': bio.get('face_height_max_mm', 36.0),
+        'min_eye_y_from_bottom_mm': bio.get('min_eye_y_from_bottom_mm', 21.8),
+        'max_eye_y_from_bottom_mm': bio.get('max_eye_y_from_bottom_mm', 29.7),
+        'max_eye_level_diff_mm': bio.get('max_eye_level_diff_mm', 1.0),
+        'max_center_deviation_mm': bio.get('max_center_deviation_mm', 2.5),
+        'max_roll_deg': bio.get('max_roll_deg', 5.0),
+        'blur_min_score': thr.get('blur_min_score', 100.0),
+        'max_dark_ratio': thr.get('max_dark_ratio', 0.5),
+        'max_bright_ratio': thr.get('max_bright_ratio', 0.5),
+        'contrast_min': thr.get('contrast_min', 30.0),
+        'uniformity_min_score': uniformity,
+        'bg_max_std': bg.get('max_std', MAX_BG_STD),
+        'bg_min_brightness': bg.get('min_brightness', MIN_BG_BRIGHTNESS),
+    }
+
+# Pass conditions per stage: (check name, fn(measurements, limits), requires).
+# The functions work on scalars (one image, used by the checkers) and on
+# numpy columns (a whole archive, see evaluate_table); NaN always fails.
+# requires names the check of the same stage that must pass for this one to
+# be reported at all (the checkers skip it otherwise, e.g. no geometry
+# without landmarks).
+RULES = {
+    'background': (
+        ('background', lambda m, L: m['count'] > 0, None),
+        ('uniformity', lambda m, L: m['max_std'] <= L['bg_max_std'], 'background'),
+        ('brightness', lambda m, L: m['brightness'] >= L['bg_min_brightness'], 'background'),
+    ),
+    'quality': (
+        ('blur', lambda m, L: m['blur_var'] >= L['blur_min_score'], None),
+        ('exposure', lambda m, L: (m['dark_ratio'] <= L['max_dark_ratio'])
+                                  & (m['bright_ratio'] <= L['max_bright_ratio']), None),
+        ('contrast', lambda m, L: m['contrast'] >= L['contrast_min'], None),
+        ('uniformity', lambda m, L: m['uniformity_score'] >= L['uniformity_min_score'], None),
+    ),
+    'geometry': (
+        ('landmarks', lambda m, L: m['landmarks'] > 0, None),
+        ('face_height', lambda m, L: (m['face_height_mm'] >= L['face_height_min_mm'])
+                                     & (m['face_height_mm'] <= L['face_height_max_mm']), 'landmarks'),
+        ('eye_position', lambda m, L: (m['eye_y_from_bottom_mm'] >= L['min_eye_y_from_bottom_mm'])
+                                      & (m['eye_y_from_bottom_mm'] <= L['max_eye_y_from_bottom_mm']), 'landmarks'),
+        ('eyes_level', lambda m, L: m['eye_diff_mm'] < L['max_eye_level_diff_mm'], 'landmarks'),
+        ('nose_center', lambda m, L: m['nose_dist_mm'] <= L['max_center_deviation_mm'], 'landmarks'),
+        ('roll', lambda m, L: np.abs(m['roll_deg']) < L['max_roll_deg'], 'landmarks'),
+    ),
+}
+_RULE_FNS = {stage: {name: fn for name, fn, _ in rules} for stage, rules in RULES.items()}
+
+# Metric every measurement of a stage has (NaN = stage not measured for that row)
+STAGE_PROBES = {'background': 'count', 'quality': 'blur_var', 'geometry': 'landmarks'}
+
+def passes(stage, check, measurements, limits):
+    """
+    Evaluate one rule for a single image's measurements.
+    """
+    return bool(_RULE_FNS[stage][check](measurements, limits))
+
+class MeasurementTable:
+    """
+    Column store of persisted measurements: one float64 array per
+    'stage.metric' (NaN where missing), plus the detection meta result and
+    whether a face was found (stages are only measured then).
+    """
+    def __init__(self, ids, columns, meta_passed, face_found=None):
+        self.ids = ids
+        self.columns = columns
+        self.meta_passed = meta_passed
+        self.face_found = face_found if face_found is not None else np.ones(len(ids), bool)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_reports(cls, records):
+        """
+        Build from reports, or batch records ({'path', 'report'}), that carry
+        report['measurements']. Records without a report (load errors) are skipped.
+        """
+        ids, rows, meta, found = [], [], [], []
+        for i, record in enumerate(records):
+            report = record.get('report', record) if 'path' in record else record
+            if not isinstance(report, dict) or 'meta' not in report:
+                continue
+            ids.append(record.get('path', i))
+            rows.append(report.get('measurements') or {})
+            meta.append(bool(report['meta'].get('passed', False)))
+            found.append('face_bbox' in report)
+
+        n = len(rows)
+        columns = {}
+        for r, measurements in enumerate(rows):
+            for stage, values in measurements.items():
+                for metric, value in values.items():
+                    if isinstance(value, (bool, int, float)):
+                        column = columns.get(f"{stage}.{metric}")
+                        if column is None:
+                            column = columns[f"{stage}.{metric}"] = np.full(n, np.nan)
+                        column[r] = float(value)
+        return cls(ids, columns, np.array(meta, dtype=bool), np.array(found, dtype=bool))
+
+    def stage(self, name):
+        """
+        Mapping metric -> column for one stage (all-NaN for unknown metrics).
+        """
+        prefix = name + "."
+        return _StageColumns({k[len(prefix):]: v for k, v in self.columns.items() if k.startswith(prefix)},
+                             len(self.ids))
+
+class _StageColumns(dict):
+    def __init__(self, columns, n):
+        super().__init__(columns)
+        self.n = n
+
+    def __missing__(self, key):
+        return np.full(self.n, np.nan)
+
+def evaluate_table(table, config):
+    """
+    Re-score every row of a MeasurementTable against the thresholds in config.
+    Results are merged like Analyzer reports: stages in STAGE_ORDER, later
+    checks of the same name replace earlier ones, and a check is only
+    evaluated where the checker would report it (stage measured, required
+    check passed); elsewhere it counts as passed.
+    Rows with a face but no measurements (reports from before measurements
+    were stored) fail the 'measurements' check.
+    :return: (checks {name: bool array}, passed bool array)
+    """
+    limits = resolve_limits(config)
+    checks = {'meta': table.meta_passed}
+    measured_any = np.zeros(len(table), bool)
+    with np.errstate(invalid='ignore'):
+        for stage in STAGE_ORDER:
+            measurements = table.stage(stage)
+            measured = ~np.isnan(measurements[STAGE_PROBES[stage]])
+            measured_any |= measured
+            results = {}
+            for name, fn, requires in RULES[stage]:
+                result = np.asarray(fn(measurements, limits), dtype=bool)
+                applies = measured if requires is None else measured & results[requires]
+                results[name] = result
+                checks[name] = np.where(applies, result, checks.get(name, True))
+    checks['measurements'] = measured_any | ~table.face_found
+    passed = np.logical_and.reduce(list(checks.values())) if checks else np.zeros(len(table), bool)
+    return checks, passed
@@ -0,0 +1,104 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+try:
+    import onnxruntime
+except ImportError: # Optional: segmentation is disabled without it
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+class Segmenter:
+    """
+    Person segmentation engine producing a soft foreground matte
+    (float32, 0..1, same size as the image).
+    Results are cached per image object, so the background check and the
+    background replacement of the same image share one inference.
+    """
+    def __init__(self, cache_size=4):
+        self.cache_size = cache_size
+        self._cache = OrderedDict() # id(img) -> (img, matte)
+        self._lock = threading.Lock()
+
+    def segment(self, img_bgr):
+        key = id(img_bgr)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] is img_bgr:
+                self._cache.move_to_end(key)
+                return entry[1]
+
+        matte = self.predict(img_bgr)
+
+        with self._lock:
+            self._cache[key] = (img_bgr, matte)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return matte
+
+    def predict(self, img_bgr):
+        raise NotImplementedError
+
+class OnnxPortraitSegmenter(Segmenter):
+    """
+    CPU onnxruntime backend for lightweight portrait matting models
+    (MODNet-style: 1x3xHxW normalized RGB in, 1x1xHxW alpha out).
+    """
+    def __init__(self, model_path, input_size=(512, 512), mean=127.5, std=127.5, rgb=True, cache_size=4):
+        super().__init__(cache_size)
+        self.session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = tuple(input_size) # (w, h)
+        self.mean = mean
+        self.std = std
+        self.rgb = rgb
+
+    def predict(self, img_bgr):
+        h, w = img_bgr.shape[:2]
+        small = cv2.resize(img_bgr, self.input_size, interpolation=cv2.INTER_AREA)
+        if self.rgb:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        blob = (small.astype(np.float32) - self.mean) / self.std
+        blob = blob.transpose(2, 0, 1)[np.newaxis]
+
+        out = self.session.run(None, {self.input_name: blob})[0]
+        matte = np.squeeze(out).astype(np.float32)
+        matte = cv2.resize(matte, (w, h), interpolation=cv2.INTER_LINEAR)
+        np.clip(matte, 0.0, 1.0, out=matte)
+        return matte
+
+# One engine per model file and process, shared by all checkers/optimizers
+_SEGMENTERS = {}
+_SEGMENTERS_LOCK = threading.Lock()
+
+def get_segmenter(config):
+    """
+    Shared segmenter for the 'segmentation' config section, or None when no
+    model is configured, the file is missing or onnxruntime is not installed
+    (callers then fall back to flood fill / GrabCut).
+    """
+    seg_cfg = (config or {}).get('segmentation', {}) or {}
+    model_path = seg_cfg.get('model_path')
+    if not model_path:
+        return None
+    if onnxruntime is None:
+        logger.warning("Segmentation disabled: onnxruntime not installed")
+        return None
+    if not os.path.exists(model_path):
+        logger.warning("Segmentation disabled: model not found at %s", model_path)
+        return None
+
+    with _SEGMENTERS_LOCK:
+        segmenter = _SEGMENTERS.get(model_path)
+        if segmenter is None:
+            segmenter = OnnxPortraitSegmenter(model_path,
+                                              input_size=seg_cfg.get('input_size', (512, 512)),
+                                              mean=seg_cfg.get('mean', 127.5),
+                                              std=seg_cfg.get('std', 127.5),
+                                              rgb=seg_cfg.get('rgb', True))
+            _SEGMENTERS[model_path] = segmenter
+        return segmenter
@@ -41,6 +41,8 @@ def load_config(config_path="app/config.yaml"):
 
 def main():
     config = load_config()
+    from app.core.log import configure_logging
+    configure_logging(config)
     app = QApplication(sys.argv)
     
     # Splash Screen
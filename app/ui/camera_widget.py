@@ -1,10 +1,11 @@
 
+import time
 import cv2
-import numpy as np
 from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QPushButton, QHBoxLayout, QFileDialog
 from PySide6.QtCore import QTimer, Signal, Qt
-from PySide6.QtGui import QPixmap, QImage
+from app.ui.display import LabelDisplay
 from app.ui.overlay_widget import OverlayWidget
+from app.ui.workers import LiveAnalysisWorker
 
 class CameraWidget(QWidget):
     # Signals
@@ -18,6 +19,8 @@ class CameraWidget(QWidget):
         self.view_label.setAlignment(Qt.AlignCenter)
         self.view_label.setStyleSheet("background-color: black;")
         self.layout.addWidget(self.view_label, 1)
+        # Frames are shown without colour conversion (live frames mirrored)
+        self.display = LabelDisplay(self.view_label, cache_size=1)
         
         # Overlay
         self.overlay = OverlayWidget(self.view_label)
@@ -34,9 +37,16 @@ class CameraWidget(QWidget):
         self.btn_toggle = QPushButton("Start Camera")
         self.btn_toggle.clicked.connect(self.toggle_camera)
         
+        # Live guidance (enabled once the analyzer is ready)
+        self.btn_live = QPushButton("Live Guidance")
+        self.btn_live.setCheckable(True)
+        self.btn_live.setEnabled(False)
+        self.btn_live.toggled.connect(self.set_live_guidance)
+        
         controls.addWidget(self.btn_toggle)
         controls.addWidget(self.btn_capture)
         controls.addWidget(self.btn_load)
+        controls.addWidget(self.btn_live)
         self.layout.addLayout(controls)
         
         # Camera internal
@@ -45,6 +55,45 @@ class CameraWidget(QWidget):
         self.timer.timeout.connect(self.update_frame)
         self.current_frame = None
         self.is_camera_active = False
+        
+        # Live analysis runs on its own thread at its own rate
+        self.live_worker = None
+        self.live_enabled = False
+        self.live_interval = 0.25 # seconds between submitted frames
+        self.last_live_submit = 0.0
+
+    def set_analyzer(self, analyzer, config=None):
+        """
+        Enable live guidance using a GeometryAnalyzer owned by the live thread
+        (not the Analyzer of the analysis service).
+        Rate comes from config 'live_guidance.analysis_fps'.
+        """
+        fps = (config or {}).get('live_guidance', {}).get('analysis_fps', 4)
+        self.live_interval = 1.0 / max(0.1, fps)
+        
+        if self.live_worker is None:
+            self.live_worker = LiveAnalysisWorker(analyzer, self)
+            self.live_worker.result.connect(self.on_live_result)
+            self.live_worker.start()
+        else:
+            self.live_worker.analyzer = analyzer
+        self.btn_live.setEnabled(True)
+
+    def set_live_guidance(self, enabled):
+        self.live_enabled = enabled
+        if not enabled:
+            self.overlay.set_guidance(None)
+
+    def on_live_result(self, report, face):
+        # Results may arrive after live mode/camera was switched off
+        if self.live_enabled and self.is_camera_active:
+            self.overlay.set_guidance(report)
+
+    def shutdown(self):
+        self.stop_camera()
+        if self.live_worker is not None:
+            self.live_worker.stop()
+            self.live_worker = None
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
@@ -73,6 +122,7 @@ class CameraWidget(QWidget):
     def stop_camera(self):
         self.is_camera_active = False
         self.timer.stop()
+        self.overlay.set_guidance(None)
         if self.cap:
             self.cap.release()
             self.cap = None
@@ -83,30 +133,20 @@ class CameraWidget(QWidget):
             ret, frame = self.cap.read()
             if ret:
                 self.current_frame = frame
-                # Mirror the frame for internal view (like a mirror)
-                # But keep self.current_frame original for capture/analysis
-                preview_frame = cv2.flip(frame, 1)
-                self.display_frame(preview_frame)
+                # Mirrored for display only (after scaling down);
+                # self.current_frame stays original for capture/analysis
+                self.display_frame(frame, mirror=True)
+                
+                # Hand the newest frame to live analysis at the configured rate;
+                # the worker drops frames it could not get to.
+                now = time.monotonic()
+                if self.live_enabled and self.live_worker and now - self.last_live_submit >= self.live_interval:
+                    self.last_live_submit = now
+                    self.live_worker.submit(frame)
 
-    def display_frame(self, frame_bgr):
-        # Convert BGR to RGB
-        frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-        h, w, ch = frame_rgb.shape
-        bytes_per_line = ch * w
-        
-        # Scale to fit label
-        lbl_w = self.view_label.width()
-        lbl_h = self.view_label.height()
-        
-        # Keep aspect ratio
-        scale = min(lbl_w / w, lbl_h / h)
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-        
-        frame_resized = cv2.resize(frame_rgb, (new_w, new_h))
-        
-        q_img = QImage(frame_resized.data, new_w, new_h, new_w * ch, QImage.Format_RGB888)
-        self.view_label.setPixmap(QPixmap.fromImage(q_img))
+    def display_frame(self, frame_bgr, mirror=False):
+        self.display.mirror = mirror
+        self.display.show(frame_bgr)
 
     def capture_image(self):
         if self.current_frame is not None:
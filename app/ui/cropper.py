@@ -1,7 +1,8 @@
 
 from PySide6.QtWidgets import QWidget
-from PySide6.QtGui import QPainter, QImage, QPixmap, QColor, QPen, QBrush
+from PySide6.QtGui import QPainter, QColor, QPen, QBrush
 from PySide6.QtCore import Qt, QRectF, QPointF, Signal
+from app.ui.display import bgr_pixmap
 
 class InteractiveCropper(QWidget):
     def __init__(self, parent=None):
@@ -30,13 +31,9 @@ class InteractiveCropper(QWidget):
         self.dim_color = QColor(0, 0, 0, 150)
         
     def set_image(self, img_bgr):
-        import cv2
-        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-        h, w, ch = img_rgb.shape
-        bytes_per_line = ch * w
-        # KEY FIX: .copy() to ensure deep copy of data because img_rgb will be garbage collected
-        self.image = QImage(img_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888).copy()
-        self.pixmap = QPixmap.fromImage(self.image)
+        # BGR888 wraps the array directly; the pixmap holds its own copy
+        self.image = img_bgr
+        self.pixmap = bgr_pixmap(img_bgr)
         
         # Reset transform to fit image
         self.reset_view()
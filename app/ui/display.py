@@ -0,0 +1,94 @@
+import numpy as np
+import cv2
+from PySide6.QtCore import QObject, QEvent
+from PySide6.QtGui import QImage, QPixmap
+
+def bgr_qimage(img_bgr):
+    """
+    Wrap a BGR uint8 buffer as a QImage (Format_BGR888) without converting or
+    copying. The QImage only borrows the buffer: keep img_bgr alive while it
+    is used, or turn it into a QPixmap right away (which copies).
+    Non-contiguous views (crops, flips) need a temporary contiguous buffer,
+    which nothing would keep alive, so the QImage gets its own copy then.
+    """
+    if not img_bgr.flags['C_CONTIGUOUS']:
+        tmp = np.ascontiguousarray(img_bgr)
+        h, w = tmp.shape[:2]
+        return QImage(tmp.data, w, h, tmp.strides[0], QImage.Format_BGR888).copy()
+    h, w = img_bgr.shape[:2]
+    return QImage(img_bgr.data, w, h, img_bgr.strides[0], QImage.Format_BGR888)
+
+def bgr_pixmap(img_bgr):
+    return QPixmap.fromImage(bgr_qimage(img_bgr))
+
+def fit_size(w, h, max_w, max_h):
+    """
+    Largest (w, h) with the image aspect ratio that fits into max_w x max_h.
+    """
+    scale = min(max_w / w, max_h / h)
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+def fit_to(img_bgr, max_w, max_h, mirror=False):
+    """
+    Resize img_bgr to fit max_w x max_h (INTER_AREA when shrinking).
+    Flipping happens after the resize, on the smaller image.
+    """
+    h, w = img_bgr.shape[:2]
+    size = fit_size(w, h, max_w, max_h)
+    if size != (w, h):
+        interp = cv2.INTER_AREA if size[0] < w else cv2.INTER_LINEAR
+        img_bgr = cv2.resize(img_bgr, size, interpolation=interp)
+    if mirror:
+        img_bgr = cv2.flip(img_bgr, 1)
+    return img_bgr
+
+class LabelDisplay(QObject):
+    """
+    Shows BGR images in a QLabel, scaled to fit with the aspect ratio kept.
+    The scaled pixmap is cached per (image, label size, mirror): showing the same
+    array again (e.g. after returning to the review screen) is free, and a
+    resize re-renders from the source image, not from the scaled pixmap.
+    Images must not be modified after being shown (EditStack renders and
+    camera frames are never written to).
+    """
+    def __init__(self, label, mirror=False, cache_size=4):
+        """
+        :param mirror: Flip horizontally for display (camera preview)
+        :param cache_size: Scaled pixmaps kept (1 for live video, whose frames never repeat)
+        """
+        super().__init__(label)
+        self.label = label
+        self.mirror = mirror
+        self.cache_size = cache_size
+        self.image = None
+        self._cache = [] # [(image, size, mirror, pixmap)], newest last
+        label.installEventFilter(self)
+
+    def show(self, img_bgr):
+        self.image = img_bgr
+        self._render()
+
+    def clear(self):
+        self.image = None
+        self._cache = []
+
+    def _render(self):
+        if self.image is None:
+            return
+        size = (self.label.width(), self.label.height())
+        if size[0] < 1 or size[1] < 1:
+            return
+        for entry in self._cache:
+            if entry[0] is self.image and entry[1] == size and entry[2] == self.mirror:
+                self.label.setPixmap(entry[3])
+                return
+
+        pixmap = bgr_pixmap(fit_to(self.image, size[0], size[1], self.mirror))
+        self._cache.append((self.image, size, self.mirror, pixmap))
+        del self._cache[:-self.cache_size]
+        self.label.setPixmap(pixmap)
+
+    def eventFilter(self, obj, event):
+        if obj is self.label and event.type() == QEvent.Resize:
+            self._render()
+        return False
@@ -10,7 +10,10 @@ from app.ui.result_widget import ResultWidget
 from app.core.optimizer import ImageOptimizer
 from app.utils.export import Exporter
 from app.ui.cropper import InteractiveCropper
-from app.ui.workers import InitWorker, AnalysisWorker
+from app.ui.display import LabelDisplay
+from app.ui.workers import InitWorker, AnalysisService, ExportNotifier
+from app.core.edits import EditStack, AdjustEdit, BackgroundEdit, CropEdit, compose_edits
+from app.core.geometry import transform_face
 
 class MainWindow(QMainWindow):
     def __init__(self, config):
@@ -18,7 +21,7 @@ class MainWindow(QMainWindow):
         self.config = config
         self.analyzer = None 
         self.optimizer = ImageOptimizer(config)
-from app.utils.export import Exporter
+from app.utils.export import Exporter, ExportQueue
 from app.ui.cropper import InteractiveCropper
 
 class MainWindow(QMainWindow):
@@ -26,11 +29,21 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.config = config
         self.analyzer = None # Lazy load or init in background to show UI fast?
+        self.live_analyzer = None # GeometryAnalyzer for the camera's live guidance thread
         self.optimizer = ImageOptimizer(config)
         self.exporter = Exporter(config)
+        # Exports run on a background pool; results come back via signals
+        self.export_queue = ExportQueue.from_config(self.exporter, config)
+        self.export_notifier = ExportNotifier()
+        self.export_notifier.finished.connect(self.on_export_finished)
+        self.export_notifier.error.connect(self.on_export_error)
         self.current_face = None
         self.current_report = None
-        self.current_image = None
+        self.edit_stack = None # EditStack over the captured image (None until a capture)
+        self.current_result = None # Last AnalysisResult (basis for incremental re-analysis)
+        self.pending_edits = [] # Edits applied since current_result
+        self.analysis_service = None # Created once models are loaded
+        self.progress_dialog = None
         # Init analyzer here for now
         self.setWindowTitle(config.get("app", {}).get("name", "PassPhotoCheck"))
         self.resize(1200, 800)
@@ -75,6 +88,7 @@ class MainWindow(QMainWindow):
         self.preview_label = QLabel("Preview")
         self.preview_label.setAlignment(Qt.AlignCenter)
         self.review_stack.addWidget(self.preview_label)
+        self.preview_display = LabelDisplay(self.preview_label)
         
         # Page 1: Cropper
         self.cropper = InteractiveCropper()
@@ -88,7 +102,9 @@ class MainWindow(QMainWindow):
         self.result_widget.btn_brighten.clicked.connect(lambda: self.adjust_brightness(1.1))
         self.result_widget.btn_darken.clicked.connect(lambda: self.adjust_brightness(0.9))
         self.result_widget.btn_fix_bg.clicked.connect(self.optimize_background)
-        self.result_widget.btn_undo.clicked.connect(self.reset_image)
+        self.result_widget.btn_undo.clicked.connect(self.undo_edit)
+        self.result_widget.btn_redo.clicked.connect(self.redo_edit)
+        self.result_widget.btn_reset.clicked.connect(self.reset_image)
         
         # Connect Crop Button
         self.result_widget.btn_crop.clicked.connect(self.toggle_crop_mode)
@@ -145,6 +161,22 @@ class MainWindow(QMainWindow):
 
     def on_init_finished(self):
         self.statusBar().showMessage("Ready", 5000)
+        self.camera_widget.set_analyzer(self.live_analyzer, self.config)
+        
+        # One long-lived analysis thread for all (re-)analysis requests
+        self.analysis_service = AnalysisService(self.analyzer, self)
+        self.analysis_service.finished.connect(self.on_analysis_finished)
+        self.analysis_service.error.connect(self.on_analysis_error)
+        self.analysis_service.start()
+
+    def closeEvent(self, event):
+        # Stop camera and worker threads before Qt tears down widgets
+        self.camera_widget.shutdown()
+        if self.analysis_service:
+            self.analysis_service.stop()
+        # Let queued exports finish writing
+        self.export_queue.shutdown(wait=True)
+        super().closeEvent(event)
 
     def on_init_error(self, err):
         self.statusBar().showMessage(f"Error initializing AI: {err}")
@@ -165,14 +197,14 @@ class MainWindow(QMainWindow):
         pass
         
     def on_image_captured(self, img_bgr):
-        self.current_image = img_bgr
-        self.original_capture = img_bgr.copy() # Store original for undo
+        # Edits never touch the capture; previews render from a proxy
+        self.edit_stack = EditStack.from_config(img_bgr, self.config)
         self.stack.setCurrentWidget(self.review_container)
         
         # Show image immediately
-        self.show_image_in_label(img_bgr, self.preview_label)
+        self.preview_display.show(self.edit_stack.preview())
         
-        if not self.analyzer:
+        if not self.analysis_service:
             QMessageBox.warning(self, "Not Ready", "AI Models are still loading. Please wait a moment.")
             return
 
@@ -185,43 +217,49 @@ class MainWindow(QMainWindow):
         self.progress_dialog.setWindowModality(Qt.WindowModal)
         self.progress_dialog.show()
         
-        # Create Thread
-        self.analysis_thread = QThread()
-        self.analysis_worker = AnalysisWorker(self.analyzer, img_bgr)
-        self.analysis_worker.moveToThread(self.analysis_thread)
-        
-        # Connect signals
-        self.analysis_thread.started.connect(self.analysis_worker.run)
-        self.analysis_worker.finished.connect(self.on_analysis_finished)
-        self.analysis_worker.finished.connect(self.analysis_thread.quit)
-        self.analysis_worker.finished.connect(self.analysis_worker.deleteLater)
-        self.analysis_thread.finished.connect(self.analysis_thread.deleteLater)
-        self.analysis_worker.error.connect(self.on_analysis_error)
-        
-        # Start
-        self.analysis_thread.start()
+        # Queue on the persistent analysis thread
+        self.current_result = None
+        self.pending_edits = []
+        self.analysis_service.submit(img_bgr, tag='new')
 
-    def on_analysis_finished(self, report, face):
+    def close_progress(self):
         if self.progress_dialog:
             self.progress_dialog.close()
-            
-        self.current_face = face
+            self.progress_dialog = None
+
+    def on_analysis_finished(self, request_id, result, tag):
+        # A newer edit was submitted meanwhile; its result will follow
+        if not self.analysis_service.is_current(request_id):
+            return
+        self.close_progress()
+        self.statusBar().clearMessage()
+        
+        report, face = result.report, result.face
+        self.current_result = result
+        self.pending_edits = []
+        
+        # Re-analysis after an edit keeps the last face if detection fails now
+        if face or tag == 'new':
+            self.current_face = face
         self.current_report = report
         self.result_widget.update_results(report)
         
         # Draw Face Box on preview
-        self.draw_face_overlay(face)
+        self.draw_face_overlay(face if face else self.current_face)
 
-    def on_analysis_error(self, err):
-        if self.progress_dialog:
-            self.progress_dialog.close()
+    def on_analysis_error(self, request_id, err):
+        if not self.analysis_service.is_current(request_id):
+            return
+        self.close_progress()
         QMessageBox.critical(self, "Analysis Error", f"An error occurred: {err}")
 
     def draw_face_overlay(self, face):
         if not face: return
         import cv2
-        img_copy = self.current_image.copy()
-        box = face.bbox.astype(int)
+        # Drawn on the preview proxy, so scale full-resolution coordinates
+        scale = self.edit_stack.preview_scale
+        img_copy = self.edit_stack.preview().copy()
+        box = (face.bbox * scale).astype(int)
         cv2.rectangle(img_copy, (box[0], box[1]), (box[2], box[3]), (0, 255, 0), 2)
         
         # Label
@@ -236,9 +274,9 @@ class MainWindow(QMainWindow):
         # Draw landmarks
         if face.kps is not None:
             for p in face.kps:
-                cv2.circle(img_copy, (int(p[0]), int(p[1])), 3, (0, 0, 255), -1)
+                cv2.circle(img_copy, (int(p[0] * scale), int(p[1] * scale)), 3, (0, 0, 255), -1)
                 
-        self.show_image_in_label(img_copy, self.preview_label)
+        self.preview_display.show(img_copy)
 
     def step_zoom(self, delta):
         val = self.result_widget.slider_zoom.value()
@@ -255,7 +293,7 @@ class MainWindow(QMainWindow):
         self.result_widget.lbl_zoom_val.setText(f"{val}%")
 
     def toggle_crop_mode(self, checked):
-        if self.current_image is None:
+        if self.edit_stack is None:
             if checked:
                 # Reset button state if no image
                 self.result_widget.btn_crop.setChecked(False)
@@ -264,7 +302,7 @@ class MainWindow(QMainWindow):
 
         if checked:
             # Enter Crop Mode
-            self.cropper.set_image(self.current_image)
+            self.cropper.set_image(self.edit_stack.preview())
             self.review_stack.setCurrentWidget(self.cropper)
             self.result_widget.btn_crop.setText("✅ Apply Crop")
             
@@ -276,6 +314,8 @@ class MainWindow(QMainWindow):
             self.result_widget.btn_darken.setEnabled(False)
             self.result_widget.btn_brighten.setEnabled(False)
             self.result_widget.btn_undo.setEnabled(False)
+            self.result_widget.btn_redo.setEnabled(False)
+            self.result_widget.btn_reset.setEnabled(False)
             self.result_widget.zoom_group.show()
         else:
             # Apply Crop
@@ -291,124 +331,138 @@ class MainWindow(QMainWindow):
             self.result_widget.btn_darken.setEnabled(True)
             self.result_widget.btn_brighten.setEnabled(True)
             self.result_widget.btn_undo.setEnabled(True)
+            self.result_widget.btn_redo.setEnabled(True)
+            self.result_widget.btn_reset.setEnabled(True)
 
     def apply_crop(self):
         # Get crop logic
-        rect = self.cropper.get_current_crop() # QRectF in image coords
+        rect = self.cropper.get_current_crop() # QRectF in preview coords
         if rect:
-            x = int(rect.x())
-            y = int(rect.y())
-            w = int(rect.width())
-            h = int(rect.height())
+            # The cropper shows the preview proxy; declare the crop in full-resolution coords
+            scale = self.edit_stack.preview_scale
+            x = rect.x() / scale
+            y = rect.y() / scale
+            w = int(rect.width() / scale)
+            h = int(rect.height() / scale)
             
             if w > 10 and h > 10:
-                import cv2
-                # Warping to handle out-of-bounds seamlessly
+                # Rendered with getRectSubPix, which handles float coords and padding
                 center = (x + w/2, y + h/2)
-                # We simply want to extract this rectangle.
-                # getRectSubPix is good but expects center.
-                
-                # Let's use getRectSubPix which handles float coords and padding
-                cropped = cv2.getRectSubPix(self.current_image, (w, h), center)
+                edit = CropEdit(center, (w, h))
                 
-                self.current_image = cropped
+                # Landmarks follow the crop analytically; no need to re-detect
+                if self.current_face is not None:
+                    self.current_face = transform_face(self.current_face, edit.matrix)
                 
-                # Rerun analysis
-                self.rerun_analysis()
-
-    def show_image_in_label(self, img_bgr, label):
-        import cv2
-        from PySide6.QtGui import QImage, QPixmap
-        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-        h, w, ch = img_rgb.shape
-        bytes_per_line = ch * w
-        
-        # Scale
-        lbl_w = label.width()
-        lbl_h = label.height()
-        scale = min(lbl_w / w, lbl_h / h)
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-        
-        img_resized = cv2.resize(img_rgb, (new_w, new_h))
-        qimg = QImage(img_resized.data, new_w, new_h, new_w * ch, QImage.Format_RGB888)
-        label.setPixmap(QPixmap.fromImage(qimg))
+                self.push_edit(edit)
 
     def reset_to_camera(self):
         self.stack.setCurrentWidget(self.capture_container)
         self.camera_widget.start_camera()
 
+    def push_edit(self, edit):
+        self.edit_stack.push(edit)
+        self.rerun_analysis(edit)
+
     def adjust_brightness(self, factor):
-        if self.current_image is None: return
-        self.current_image = self.optimizer.adjust_brightness(self.current_image, factor)
-        self.rerun_analysis()
+        if self.edit_stack is None: return
+        # Consecutive adjustments are fused into one LUT pass from the unadjusted image
+        self.push_edit(AdjustEdit("brightness", brightness=factor))
         
     def optimize_background(self):
-        if self.current_image is None or self.current_face is None: return
+        if self.edit_stack is None or self.current_face is None: return
         # Background fix logic
         # We use singleShot to allow UI to breathe or show loading if we had one
         QTimer.singleShot(50, lambda: self._run_bg_fix())
 
     def _run_bg_fix(self):
-        self.current_image = self.optimizer.optimize_background(self.current_image, self.current_face)
-        self.rerun_analysis()
+        self.push_edit(BackgroundEdit(self.current_face.bbox))
+
+    def undo_edit(self):
+        if self.edit_stack is None: return
+        edit = self.edit_stack.undo()
+        if edit is not None:
+            self.apply_history_step(edit.inverse())
+
+    def redo_edit(self):
+        if self.edit_stack is None: return
+        edit = self.edit_stack.redo()
+        if edit is not None:
+            self.apply_history_step(edit)
+
+    def apply_history_step(self, edit):
+        # Carry the face through crops (and their inverses) like a new edit
+        if self.current_face is not None:
+            self.current_face = transform_face(self.current_face, edit.matrix)
+        self.rerun_analysis(edit)
         
     def reset_image(self):
-        if hasattr(self, 'original_capture') and self.original_capture is not None:
-            self.current_image = self.original_capture.copy()
+        if self.edit_stack is not None:
+            self.edit_stack.reset()
             self.rerun_analysis()
             
-    def rerun_analysis(self):
+    def rerun_analysis(self, edit=None):
+        """
+        Re-analyze the current edit state. With an edit, only the checks it
+        invalidates are recomputed; without one (e.g. reset) the full pipeline runs.
+        The preview is shown immediately; the full-resolution render happens
+        on the analysis thread.
+        """
         # Show Image
-        self.show_image_in_label(self.current_image, self.preview_label)
-        
-        # Re-Run Analysis
-        if self.analyzer:
-            report, face = self.analyzer.analyze(self.current_image)
-            # Only update current_face if we found one, otherwise keep old or strict?
-            # Actually if we adjust brightness, face detection should still work, maybe better.
-            if face:
-                 self.current_face = face
-            self.current_report = report
-            self.result_widget.update_results(report)
-            
-            # Draw Face Box on preview for feedback
-            face_to_draw = face if face else self.current_face
-            
-            if face_to_draw:
-                import cv2
-                box = face_to_draw.bbox.astype(int)
-                img_copy = self.current_image.copy()
-                
-                # Green Box = Detected Face
-                cv2.rectangle(img_copy, (box[0], box[1]), (box[2], box[3]), (0, 255, 0), 2)
-                
-                # Label
-                label_text = "Detected Face"
-                (w, h), _ = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-                # Background strip
-                cv2.rectangle(img_copy, (box[0], box[1] - 25), (box[0] + w + 10, box[1]), (0, 255, 0), -1)
-                # Text
-                cv2.putText(img_copy, label_text, (box[0] + 5, box[1] - 5), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2) # Black text
-
-                # Draw landmarks
-                if face_to_draw.kps is not None:
-                    for p in face_to_draw.kps:
-                        cv2.circle(img_copy, (int(p[0]), int(p[1])), 3, (0, 0, 255), -1)
-                        
-                self.show_image_in_label(img_copy, self.preview_label)
+        self.preview_display.show(self.edit_stack.preview())
+        
+        # Results of superseded requests are dropped, so collect every edit
+        # since the last result we actually received. Until a full analysis
+        # has returned (current_result None) every request is a full one.
+        if edit is None:
+            self.current_result = None
+            self.pending_edits = []
+            previous, combined = None, None
+        else:
+            self.pending_edits.append(edit)
+            previous, combined = self.current_result, compose_edits(self.pending_edits)
+        
+        # Re-Run Analysis off the GUI thread
+        if self.analysis_service:
+            self.statusBar().showMessage("Re-analyzing...")
+            self.analysis_service.submit(self.edit_stack.snapshot(), tag='rerun', previous=previous, edit=combined)
 
     def export_results(self):
-        if self.current_image is not None and self.current_report is not None:
-             res = self.exporter.export(self.current_image, self.current_face, self.current_report)
-             if 'image_path' in res:
-                 QMessageBox.information(self, "Export Successful", f"Saved to {res['image_path']}")
+        if self.edit_stack is not None and self.current_report is not None:
+             # Full resolution is rendered on the export thread
+             image = self.edit_stack.snapshot()
+             if self.exporter.presets:
+                 future = self.export_queue.export_presets(image, self.current_face, self.current_report,
+                                                           callback=self.export_notifier.callback('export'))
              else:
-                 QMessageBox.warning(self, "Export Partial", f"Saved report but could not crop image: {res.get('msg')}")
+                 future = self.export_queue.export(image, self.current_face, self.current_report,
+                                                   callback=self.export_notifier.callback('export'))
+             self.show_export_queued(future)
         else:
              QMessageBox.warning(self, "Export Failed", "No analyis data to export.")
 
+    def show_export_queued(self, future):
+        if future is None:
+            QMessageBox.warning(self, "Export Busy", "Too many exports in progress. Please try again in a moment.")
+        else:
+            self.statusBar().showMessage("Exporting in background...")
+
+    def on_export_finished(self, kind, res):
+        self.statusBar().clearMessage()
+        if kind == 'exact':
+            QMessageBox.information(self, "Exact Export Successful", f"Saved EXACT preview to {res['image_path']}")
+        elif len(res.get('images', {})) > 1:
+            paths = "\n".join(res['images'].values())
+            QMessageBox.information(self, "Export Successful", f"Saved {len(res['images'])} files:\n{paths}")
+        elif 'image_path' in res:
+            QMessageBox.information(self, "Export Successful", f"Saved to {res['image_path']}")
+        else:
+            QMessageBox.warning(self, "Export Partial", f"Saved report but could not crop image: {res.get('msg')}")
+
+    def on_export_error(self, err):
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Export Failed", f"An error occurred: {err}")
+
     def load_new_file(self):
         from PySide6.QtWidgets import QFileDialog
         file_name, _ = QFileDialog.getOpenFileName(self, "Open Image", "", "Images (*.png *.jpg *.jpeg *.bmp)")
@@ -421,9 +475,9 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Error", "Could not load image.")
 
     def export_exact_results(self):
-        if self.current_image is not None and self.current_report is not None:
-             res = self.exporter.save_exact_image(self.current_image, self.current_report)
-             if 'image_path' in res:
-                 QMessageBox.information(self, "Exact Export Successful", f"Saved EXACT preview to {res['image_path']}")
+        if self.edit_stack is not None and self.current_report is not None:
+             future = self.export_queue.save_exact_image(self.edit_stack.snapshot(), self.current_report,
+                                                         callback=self.export_notifier.callback('exact'))
+             self.show_export_queued(future)
         else:
              QMessageBox.warning(self, "Export Failed", "No image to export.")
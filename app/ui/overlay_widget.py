@@ -9,6 +9,11 @@ class OverlayWidget(QWidget):
         self.setAttribute(Qt.WA_TransparentForMouseEvents)
         self.ratio = 35 / 45
         self.scale_factor = 1.0
+        self.guidance = None # Latest live analysis report (or None)
+
+    def set_guidance(self, report):
+        self.guidance = report
+        self.update()
 
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -36,6 +41,10 @@ class OverlayWidget(QWidget):
         # Actually standard BMI template is just lines
         
         pen = QPen(QColor(0, 255, 255), 3) # Cyan color
+        if self.guidance is not None:
+            # Live guidance: green when geometry passes, red otherwise
+            passed = self.guidance.get('is_passed', False)
+            pen = QPen(QColor(0, 220, 0) if passed else QColor(255, 60, 60), 3)
         painter.setPen(pen)
         painter.drawRect(self.box_rect)
         
@@ -96,6 +105,24 @@ class OverlayWidget(QWidget):
         painter.setPen(QPen(Qt.white))
         painter.drawText(x + 5, y_eye_upper_limit - 5, "Eye Zone Top")
         painter.drawText(x + 5, y_eye_lower_limit + 15, "Eye Zone Bottom")
+        
+        if self.guidance is not None:
+            self.draw_guidance(painter, x, y)
+
+    def draw_guidance(self, painter, x, y):
+        # List failing checks in the top-left corner of the box
+        lines = []
+        for key, data in self.guidance.items():
+            if isinstance(data, dict) and not data.get('passed', True):
+                lines.append(f"{key.replace('_', ' ').title()}: {data.get('msg', '')}")
+        if lines:
+            painter.setPen(QPen(QColor(255, 60, 60)))
+        else:
+            lines = ["Position OK"]
+            painter.setPen(QPen(QColor(0, 220, 0)))
+
+        for i, line in enumerate(lines):
+            painter.drawText(x + 5, y + 18 + i * 16, line)
 
     def get_crop_rect(self):
         return self.box_rect
@@ -43,10 +43,14 @@ class ResultWidget(QWidget):
         # Special
         tools_layout = QHBoxLayout()
         self.btn_fix_bg = QPushButton("Fix Background")
-        self.btn_undo = QPushButton("↩️ Reset / Undo")
+        self.btn_undo = QPushButton("↩️ Undo")
+        self.btn_redo = QPushButton("↪️ Redo")
+        self.btn_reset = QPushButton("Reset")
         
         tools_layout.addWidget(self.btn_fix_bg)
         tools_layout.addWidget(self.btn_undo)
+        tools_layout.addWidget(self.btn_redo)
+        tools_layout.addWidget(self.btn_reset)
         opt_layout.addLayout(tools_layout)
         
         self.layout.addWidget(self.opt_group)
@@ -1,6 +1,9 @@
 
 from PySide6.QtCore import QObject, Signal, QThread
-import traceback
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 class InitWorker(QObject):
     finished = Signal()
@@ -12,26 +15,141 @@ class InitWorker(QObject):
         
     def run(self):
         try:
-            from app.core.analyzer import Analyzer
+            from app.core.analyzer import Analyzer, GeometryAnalyzer
             self.main_window.analyzer = Analyzer(self.main_window.config)
+            # Live guidance runs next to the analysis service: own detector state
+            self.main_window.live_analyzer = GeometryAnalyzer(self.main_window.config)
             self.finished.emit()
         except Exception as e:
-            traceback.print_exc()
+            logger.exception("Model initialization failed")
             self.error.emit(str(e))
 
-class AnalysisWorker(QObject):
-    finished = Signal(object, object) # report, face
-    error = Signal(str)
+class LatestRequestThread(QThread):
+    """
+    Persistent worker thread with a single pending slot.
+    Submitting replaces any request not yet picked up (latest wins), so
+    superseded work is dropped instead of queuing up. Subclasses implement
+    process(request).
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cond = threading.Condition()
+        self._pending = None
+        self._running = True
+        
+    def submit(self, request):
+        with self._cond:
+            self._pending = request
+            self._cond.notify()
+            
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._pending = None
+            self._cond.notify()
+        self.wait()
+        
+    def run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                request = self._pending
+                self._pending = None
+                
+            self.process(request)
+            
+    def process(self, request):
+        raise NotImplementedError
+
+class AnalysisService(LatestRequestThread):
+    """
+    Long-lived analysis thread for the review screen.
+    Every submit() gets a new request id; results of requests superseded by a
+    later submit (e.g. while dragging through several edits) are discarded.
+    Passing the previous AnalysisResult and the Edit applied since then makes
+    the analyzer recompute only the invalidated checks. image may be a
+    callable (e.g. EditStack.snapshot()) that renders it on this thread.
+    """
+    finished = Signal(int, object, object) # request_id, AnalysisResult, tag
+    error = Signal(int, str)
     
-    def __init__(self, analyzer, image):
-        super().__init__()
+    def __init__(self, analyzer, parent=None):
+        super().__init__(parent)
         self.analyzer = analyzer
-        self.image = image
+        self._latest_id = 0
+        self._id_lock = threading.Lock()
         
-    def run(self):
+    def submit(self, image, tag=None, previous=None, edit=None):
+        with self._id_lock:
+            self._latest_id += 1
+            request_id = self._latest_id
+        super().submit((request_id, image, tag, previous, edit))
+        return request_id
+        
+    def cancel(self):
+        """
+        Drop the pending request and ignore the result of the running one.
+        """
+        with self._id_lock:
+            self._latest_id += 1
+        with self._cond:
+            self._pending = None
+            
+    def is_current(self, request_id):
+        with self._id_lock:
+            return request_id == self._latest_id
+        
+    def process(self, request):
+        request_id, image, tag, previous, edit = request
         try:
-            report, face = self.analyzer.analyze(self.image)
-            self.finished.emit(report, face)
+            if callable(image):
+                image = image()
+            result = self.analyzer.run(image, previous, edit)
         except Exception as e:
-            traceback.print_exc()
-            self.error.emit(str(e))
+            logger.exception("Analysis request failed")
+            if self.is_current(request_id):
+                self.error.emit(request_id, str(e))
+            return
+        # Receivers should re-check is_current(): a newer request may be
+        # submitted while this signal is queued to the GUI thread.
+        if self.is_current(request_id):
+            self.finished.emit(request_id, result, tag)
+
+class LiveAnalysisWorker(LatestRequestThread):
+    """
+    Persistent thread analyzing camera preview frames for live guidance.
+    Only the newest frame is kept, so analysis never backs up behind the
+    30 fps display. Needs its own GeometryAnalyzer: the Analyzer of the
+    AnalysisService is not safe to use from two threads.
+    """
+    result = Signal(object, object) # report, face
+    
+    def __init__(self, analyzer, parent=None):
+        super().__init__(parent)
+        self.analyzer = analyzer
+        
+    def process(self, frame):
+        try:
+            report, face = self.analyzer.analyze_geometry(frame)
+            self.result.emit(report, face)
+        except Exception:
+            logger.exception("Live analysis failed")
+
+class ExportNotifier(QObject):
+    """
+    Bridges ExportQueue callbacks (worker threads) to the GUI thread.
+    """
+    finished = Signal(str, object) # kind, result dict
+    error = Signal(str)
+    
+    def callback(self, kind):
+        def on_done(future):
+            try:
+                self.finished.emit(kind, future.result())
+            except Exception as e:
+                logger.exception("Export failed")
+                self.error.emit(str(e))
+        return on_done
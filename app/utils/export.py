@@ -1,15 +1,150 @@
 
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
+import numpy as np
 from datetime import datetime
 
+MAX_FILE_SIZE_BYTES = 3 * 1024 * 1024 # 3MB upload limit
+
+# Typical JPEG size relative to quality 95 (libjpeg, photographic content).
+# Only used to pick the first probe of the quality search.
+_JPEG_SIZE_MODEL = {95: 1.0, 90: 0.68, 85: 0.53, 80: 0.45, 75: 0.40, 70: 0.36,
+                    60: 0.30, 50: 0.26, 40: 0.22, 30: 0.18, 20: 0.14, 15: 0.12}
+
+def _encode(img, quality):
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf
+
+def _predict_quality(size_at_max, max_bytes, lo, hi):
+    """
+    Highest quality the size model expects to fit, clamped to [lo, hi].
+    """
+    fitting = [q for q, ratio in _JPEG_SIZE_MODEL.items() if size_at_max * ratio < max_bytes]
+    guess = max(fitting) if fitting else lo
+    return int(np.clip(guess, lo, hi))
+
+# LANCZOS4 reads 8x8 source pixels (3 before, 4 after); 1 extra for rounding
+_LANCZOS_PAD = 5
+# Below this scale, shrink the ROI with INTER_AREA first (Lanczos in
+# warpAffine does not prefilter), leaving the final resample at ~1/1.25x
+_PREDOWNSCALE_BELOW = 0.5
+_PREDOWNSCALE_HEADROOM = 1.25
+
+def warp_roi(img, M, size):
+    """
+    cv2.warpAffine(img, M, size, INTER_LANCZOS4) touching only the source
+    region that maps into the output (plus kernel padding). For strong
+    downscales the ROI is pre-shrunk with INTER_AREA. M has no rotation.
+    """
+    h, w = img.shape[:2]
+    out_w, out_h = size
+    sx, sy = M[0, 0], M[1, 1]
+    scale = min(abs(sx), abs(sy))
+    pre = scale * _PREDOWNSCALE_HEADROOM if scale < _PREDOWNSCALE_BELOW else 1.0
+    # The kernel padding is needed in the (pre-shrunk) ROI, so scale it up in source pixels
+    pad = int(np.ceil(_LANCZOS_PAD / pre))
+    
+    # Source rectangle covering the output (inverse of the scale + shift)
+    src_x0 = (0 - M[0, 2]) / sx
+    src_x1 = (out_w - M[0, 2]) / sx
+    src_y0 = (0 - M[1, 2]) / sy
+    src_y1 = (out_h - M[1, 2]) / sy
+    x0 = int(max(0, np.floor(min(src_x0, src_x1)) - pad))
+    x1 = int(min(w, np.ceil(max(src_x0, src_x1)) + pad))
+    y0 = int(max(0, np.floor(min(src_y0, src_y1)) - pad))
+    y1 = int(min(h, np.ceil(max(src_y0, src_y1)) + pad))
+    if x1 <= x0 or y1 <= y0:
+        return cv2.warpAffine(img, M, size, flags=cv2.INTER_LANCZOS4)
+    
+    roi = img[y0:y1, x0:x1] # View, no copy
+    M = M.astype(np.float64).copy()
+    M[:, 2] += M[:, :2] @ np.array([x0, y0], dtype=np.float64)
+    
+    if pre < 1.0:
+        rh, rw = roi.shape[:2]
+        small_w, small_h = max(1, int(round(rw * pre))), max(1, int(round(rh * pre)))
+        roi = cv2.resize(roi, (small_w, small_h), interpolation=cv2.INTER_AREA)
+        fx, fy = small_w / rw, small_h / rh
+        # Pixel centres: roi_x = (small_x + 0.5) / fx - 0.5
+        M[:, 2] += M[:, 0] * (0.5 / fx - 0.5) + M[:, 1] * (0.5 / fy - 0.5)
+        M[:, 0] /= fx
+        M[:, 1] /= fy
+    
+    return cv2.warpAffine(roi, M, size, flags=cv2.INTER_LANCZOS4)
+
+def encode_jpeg_within(img, max_bytes, max_quality=95, min_quality=15):
+    """
+    Encode img as JPEG in memory with the highest quality whose size stays
+    below max_bytes. Binary search over quality, first probe predicted by a
+    size model. If even min_quality is too large, that encoding is returned.
+    Returns (buffer, quality).
+    """
+    buf = _encode(img, max_quality)
+    if len(buf) < max_bytes:
+        return buf, max_quality
+
+    best = None
+    smallest = (buf, max_quality)
+    lo, hi = min_quality, max_quality - 1
+    probe = _predict_quality(len(buf), max_bytes, lo, hi)
+    while lo <= hi:
+        buf = _encode(img, probe)
+        if len(buf) < max_bytes:
+            best = (buf, probe)
+            lo = probe + 1
+        else:
+            smallest = (buf, probe) if probe < smallest[1] else smallest
+            hi = probe - 1
+        probe = (lo + hi) // 2
+
+    if best is None:
+        # Nothing fits: fall back to the lowest quality (as before)
+        return smallest if smallest[1] == min_quality else (_encode(img, min_quality), min_quality)
+    return best
+
+# Named output variants for export_presets().
+# format: jpg/png/webp; dpi: resolution of the 35x45mm print (or width: pixels);
+# max_bytes: JPEG size budget (quality search); quality: fixed JPEG/WebP quality
+EXPORT_PRESETS = {
+    'print': {'format': 'jpg', 'dpi': 600, 'max_bytes': MAX_FILE_SIZE_BYTES},
+    'print_png': {'format': 'png', 'dpi': 600},
+    'web': {'format': 'webp', 'dpi': 300, 'quality': 90},
+    'thumbnail': {'format': 'jpg', 'width': 160, 'quality': 85},
+}
+
 class Exporter:
     def __init__(self, config):
         self.config = config
         self.output_dir = "output"
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
+        export_cfg = config.get('export', {}) or {}
+        # Preset definitions (built-ins, overridable in config) and the default selection
+        self.preset_specs = dict(EXPORT_PRESETS)
+        self.preset_specs.update(export_cfg.get('preset_definitions', {}) or {})
+        self.presets = list(export_cfg.get('presets', []) or [])
+        self.preset_workers = export_cfg.get('preset_workers', 4)
+        # Base names handed out so far (exports may run concurrently)
+        self._reserved = set()
+        self._names_lock = threading.Lock()
+
+    def _unique_base_name(self, base_name):
+        """
+        Reserve base_name, adding a counter if it is taken (same second).
+        """
+        with self._names_lock:
+            name = base_name
+            n = 2
+            while name in self._reserved or os.path.exists(os.path.join(self.output_dir, f"{name}_report.json")):
+                name = f"{base_name}_{n}"
+                n += 1
+            self._reserved.add(name)
+            return name
 
     def export(self, img_bgr, face_info, report, original_filename="capture"):
         """
@@ -18,45 +153,13 @@ class Exporter:
         Uses INTER_LANCZOS4 for best quality and unsharp mask.
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = f"{original_filename}_{timestamp}"
+        base_name = self._unique_base_name(f"{original_filename}_{timestamp}")
         
         results = {}
         
         # 1. Image Export
         if face_info:
-            bbox = face_info.bbox
-            face_h = bbox[3] - bbox[1]
-            face_w = bbox[2] - bbox[0]
-            cx = (bbox[0] + bbox[2]) / 2
-            cy = (bbox[1] + bbox[3]) / 2
-            
-            # Calculate Target Pixels based on Config DPI
-            dpi = self.config.get('biometrics', {}).get('resolution_dpi', 600)
-            width_mm = self.config.get('biometrics', {}).get('output_width_mm', 35)
-            height_mm = self.config.get('biometrics', {}).get('output_height_mm', 45)
-            # 1 inch = 25.4 mm
-            target_w = int((width_mm / 25.4) * dpi)
-            target_h = int((height_mm / 25.4) * dpi)
-            
-            # Face height in target:
-            # Standard ICAO: 32-36mm (approx 71-80%)
-            # Optimized Target: 31mm (Safe zone, ~69%)
-            target_face_h_mm = 31.0 
-            target_face_h_pix = (target_face_h_mm / height_mm) * target_h
-            
-            scale = target_face_h_pix / face_h
-            
-            M = cv2.getRotationMatrix2D((cx, cy), 0, scale)
-            M[0, 2] += (target_w / 2) - cx
-            M[1, 2] += (target_h / 2) - cy 
-            
-            # Use LANCZOS4 for high quality resizing
-            final_img = cv2.warpAffine(img_bgr, M, (target_w, target_h), flags=cv2.INTER_LANCZOS4)
-            
-            # Apply Unsharp Mask (Sharpening)
-            # Standard technique: Sharpened = Original + (Original - Blurred) * Amount
-            gaussian_3 = cv2.GaussianBlur(final_img, (0, 0), 2.0)
-            final_img = cv2.addWeighted(final_img, 1.5, gaussian_3, -0.5, 0)
+            final_img = self.render_master(img_bgr, face_info)
             
             img_path = os.path.join(self.output_dir, f"{base_name}.jpg")
             
@@ -71,13 +174,128 @@ class Exporter:
         
         return results
 
+    def export_presets(self, img_bgr, face_info, report, presets=None, original_filename="capture"):
+        """
+        Export several sizes/formats of the same crop plus the JSON report.
+        All variants come from one warped master (see render_presets) and are
+        encoded and written in parallel.
+        :param presets: Preset names (default: export.presets from config)
+        :return: dict with 'images' {name: path}, 'image_path' (first preset) and 'json_path'
+        """
+        names = list(presets if presets is not None else self.presets)
+        specs = {name: self._preset_spec(name) for name in names}
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_name = self._unique_base_name(f"{original_filename}_{timestamp}")
+        
+        results = {'images': {}}
+        if face_info and names:
+            images = self.render_presets(img_bgr, face_info, specs)
+            paths = {name: os.path.join(self.output_dir, f"{base_name}_{name}.{specs[name]['format']}")
+                     for name in names}
+            # imencode releases the GIL, so the encoders run truly in parallel
+            with ThreadPoolExecutor(max_workers=max(1, min(len(names), self.preset_workers))) as pool:
+                list(pool.map(lambda name: self._save_image(paths[name], images[name], specs[name]), names))
+            results['images'] = paths
+            results['image_path'] = paths[names[0]]
+        elif not face_info:
+            results['msg'] = "No face to crop"
+        
+        self._save_report(report, base_name)
+        results['json_path'] = os.path.join(self.output_dir, f"{base_name}_report.json")
+        return results
+
+    def render_presets(self, img_bgr, face_info, specs):
+        """
+        Render the images for {name: spec} with a resolution cascade: the
+        original is warped once at the largest requested size, every smaller
+        size is area-downscaled from the next larger one.
+        """
+        width_mm = self.config.get('biometrics', {}).get('output_width_mm', 35)
+        height_mm = self.config.get('biometrics', {}).get('output_height_mm', 45)
+        # Width-only presets (thumbnails) are expressed as an equivalent dpi
+        dpis = {name: spec['dpi'] if 'dpi' in spec else spec['width'] * 25.4 / width_mm
+                for name, spec in specs.items()}
+        
+        master = self.render_master(img_bgr, face_info, dpi=max(dpis.values()))
+        images = {}
+        level = master
+        for name in sorted(specs, key=lambda n: dpis[n], reverse=True):
+            size = (int(width_mm / 25.4 * dpis[name]), int(height_mm / 25.4 * dpis[name]))
+            if (level.shape[1], level.shape[0]) != size:
+                level = cv2.resize(level, size, interpolation=cv2.INTER_AREA)
+            images[name] = level
+        return images
+
+    def _preset_spec(self, name):
+        spec = self.preset_specs.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown export preset: {name}")
+        return spec
+
+    def _save_image(self, path, img, spec):
+        fmt = spec.get('format', 'jpg')
+        if fmt == 'jpg' and spec.get('max_bytes'):
+            return self._save_compressed(path, img, max_size_bytes=spec['max_bytes'])
+        if fmt == 'jpg':
+            params = [cv2.IMWRITE_JPEG_QUALITY, int(spec.get('quality', 95))]
+        elif fmt == 'webp':
+            params = [cv2.IMWRITE_WEBP_QUALITY, int(spec.get('quality', 90))]
+        elif fmt == 'png':
+            params = [cv2.IMWRITE_PNG_COMPRESSION, int(spec.get('compression', 3))]
+        else:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        ok, buf = cv2.imencode(f".{fmt}", img, params)
+        if not ok:
+            raise ValueError(f"{fmt.upper()} encoding failed")
+        with open(path, "wb") as f:
+            f.write(buf)
+
+    def render_master(self, img_bgr, face_info, dpi=None):
+        """
+        Crop, scale and sharpen the photo to the 35x45mm target at dpi
+        (default biometrics.resolution_dpi), centred on the face.
+        """
+        bbox = face_info.bbox
+        face_h = bbox[3] - bbox[1]
+        cx = (bbox[0] + bbox[2]) / 2
+        cy = (bbox[1] + bbox[3]) / 2
+        
+        # Calculate Target Pixels based on Config DPI
+        if dpi is None:
+            dpi = self.config.get('biometrics', {}).get('resolution_dpi', 600)
+        width_mm = self.config.get('biometrics', {}).get('output_width_mm', 35)
+        height_mm = self.config.get('biometrics', {}).get('output_height_mm', 45)
+        # 1 inch = 25.4 mm
+        target_w = int((width_mm / 25.4) * dpi)
+        target_h = int((height_mm / 25.4) * dpi)
+        
+        # Face height in target:
+        # Standard ICAO: 32-36mm (approx 71-80%)
+        # Optimized Target: 31mm (Safe zone, ~69%)
+        target_face_h_mm = 31.0 
+        target_face_h_pix = (target_face_h_mm / height_mm) * target_h
+        
+        scale = target_face_h_pix / face_h
+        
+        M = cv2.getRotationMatrix2D((cx, cy), 0, scale)
+        M[0, 2] += (target_w / 2) - cx
+        M[1, 2] += (target_h / 2) - cy 
+        
+        # Use LANCZOS4 for high quality resizing, on the needed source ROI only
+        final_img = warp_roi(img_bgr, M, (target_w, target_h))
+        
+        # Apply Unsharp Mask (Sharpening)
+        # Standard technique: Sharpened = Original + (Original - Blurred) * Amount
+        gaussian_3 = cv2.GaussianBlur(final_img, (0, 0), 2.0)
+        return cv2.addWeighted(final_img, 1.5, gaussian_3, -0.5, 0)
+
     def save_exact_image(self, img_bgr, report, original_filename="capture"):
         """
         Saves the image exactly as provided (no re-cropping).
         Useful for manual crops.
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = f"{original_filename}_{timestamp}_manual"
+        base_name = self._unique_base_name(f"{original_filename}_{timestamp}_manual")
         
         img_path = os.path.join(self.output_dir, f"{base_name}.jpg")
         self._save_compressed(img_path, img_bgr)
@@ -86,15 +304,12 @@ class Exporter:
         
         return {'image_path': img_path}
 
-    def _save_compressed(self, path, img):
-        quality = 95
-        max_size_bytes = 3 * 1024 * 1024 # 3MB
-        
-        while quality > 10:
-            cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, quality])
-            if os.path.getsize(path) < max_size_bytes:
-                break
-            quality -= 5
+    def _save_compressed(self, path, img, max_size_bytes=MAX_FILE_SIZE_BYTES):
+        buf, quality = encode_jpeg_within(img, max_size_bytes)
+        # Encoded in memory; the file is written exactly once
+        with open(path, "wb") as f:
+            f.write(buf)
+        return quality
 
     def _save_report(self, report, base_name):
         json_path = os.path.join(self.output_dir, f"{base_name}_report.json")
@@ -104,3 +319,58 @@ class Exporter:
                 if hasattr(o, 'tolist'): return o.tolist()
                 return str(o)
             json.dump(report, f, indent=4, default=default)
+
+def _with_image(fn, img_or_render, *args):
+    img = img_or_render() if callable(img_or_render) else img_or_render
+    return fn(img, *args)
+
+class ExportQueue:
+    """
+    Runs Exporter jobs (warp, encode, write) on a background thread pool.
+    At most max_pending jobs may be queued or running; submit() returns None
+    when full (or blocks, if asked to) so callers get backpressure instead of
+    an unbounded backlog. callback(future) runs on the worker thread.
+    Images may be passed as callables returning the image (e.g.
+    EditStack.snapshot()), so rendering also happens off the caller's thread.
+    """
+    def __init__(self, exporter, workers=2, max_pending=4):
+        self.exporter = exporter
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    @classmethod
+    def from_config(cls, exporter, config):
+        export_cfg = config.get('export', {}) or {}
+        return cls(exporter, export_cfg.get('workers', 2), export_cfg.get('max_pending', 4))
+
+    def submit(self, fn, *args, callback=None, block=False, **kwargs):
+        if not self._slots.acquire(blocking=block):
+            return None
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+
+        def done(f):
+            self._slots.release()
+            if callback:
+                callback(f)
+        future.add_done_callback(done)
+        return future
+
+    def export(self, img_bgr, face_info, report, original_filename="capture", callback=None, block=False):
+        return self.submit(_with_image, self.exporter.export, img_bgr, face_info, report, original_filename,
+                           callback=callback, block=block)
+
+    def export_presets(self, img_bgr, face_info, report, presets=None, original_filename="capture",
+                       callback=None, block=False):
+        return self.submit(_with_image, self.exporter.export_presets, img_bgr, face_info, report, presets, original_filename,
+                           callback=callback, block=block)
+
+    def save_exact_image(self, img_bgr, report, original_filename="capture", callback=None, block=False):
+        return self.submit(_with_image, self.exporter.save_exact_image, img_bgr, report, original_filename,
+                           callback=callback, block=block)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+import cv2
+import numpy as np
+import yaml
+from app.core.log import configure_logging, correlation
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Per-process Analyzer (each worker holds its own InsightFace session)
+_analyzer = None
+
+def load_config(config_path):
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+def find_images(root):
+    """
+    Walk a directory tree and yield image paths in a stable order.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+def _init_worker(config):
+    global _analyzer
+    # One process per core: keep OpenCV from spawning its own thread pool on top
+    cv2.setNumThreads(1)
+    configure_logging(config)
+    from app.core.analyzer import Analyzer
+    _analyzer = Analyzer(config)
+
+def _analyze_path(path):
+    start = time.perf_counter()
+    img = cv2.imread(path)
+    if img is None:
+        return {'path': path, 'error': "Could not load image", 'latency_ms': 0.0}
+
+    # Log records of this image carry its path
+    with correlation(path):
+        report, _ = _analyzer.analyze(img)
+    latency_ms = (time.perf_counter() - start) * 1000.0
+    return {'path': path, 'report': report, 'latency_ms': round(latency_ms, 2)}
+
+def _json_default(o):
+    if hasattr(o, 'item'):
+        return o.item()
+    if hasattr(o, 'tolist'):
+        return o.tolist()
+    return str(o)
+
+def summarize(latencies, elapsed):
+    """
+    Aggregate throughput and latency percentiles for the processed images.
+    """
+    count = len(latencies)
+    if count == 0:
+        return {'images': 0, 'images_per_s': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0}
+    lat = np.asarray(latencies)
+    return {
+        'images': count,
+        'images_per_s': round(count / elapsed, 2) if elapsed > 0 else 0.0,
+        'p50_ms': round(float(np.percentile(lat, 50)), 2),
+        'p95_ms': round(float(np.percentile(lat, 95)), 2),
+    }
+
+def run_batch(root, config, workers=None, out=sys.stdout, progress_every=50):
+    """
+    Analyze every image below root with a pool of worker processes.
+    Per-image reports are streamed to `out` as JSON lines as they complete,
+    throughput is reported on stderr.
+    """
+    workers = workers or os.cpu_count() or 1
+    paths = list(find_images(root))
+    print(f"Found {len(paths)} images, using {workers} workers", file=sys.stderr)
+
+    latencies = []
+    passed = 0
+    failed = 0
+    errors = 0
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+        for result in pool.imap_unordered(_analyze_path, paths, chunksize=4):
+            if 'error' in result:
+                errors += 1
+            else:
+                latencies.append(result['latency_ms'])
+                if result['report'].get('is_passed'):
+                    passed += 1
+                else:
+                    failed += 1
+
+            out.write(json.dumps(result, default=_json_default) + "\n")
+            out.flush()
+
+            done = passed + failed + errors
+            if progress_every and done % progress_every == 0:
+                stats = summarize(latencies, time.perf_counter() - start)
+                print(f"[{done}/{len(paths)}] {stats['images_per_s']} img/s, "
+                      f"p50 {stats['p50_ms']}ms, p95 {stats['p95_ms']}ms", file=sys.stderr)
+
+    stats = summarize(latencies, time.perf_counter() - start)
+    stats.update({'passed': passed, 'failed': failed, 'errors': errors})
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a directory of passport photos without GUI.")
+    parser.add_argument("input_dir", help="Directory to scan recursively for images")
+    parser.add_argument("-o", "--output", help="Write JSON-lines reports to this file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("-c", "--config", default=os.path.join("app", "config.yaml"), help="Path to config.yaml")
+    parser.add_argument("--progress-every", type=int, default=50, help="Print throughput every N images (0 = off)")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    configure_logging(config)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            stats = run_batch(args.input_dir, config, args.workers, f, args.progress_every)
+    else:
+        stats = run_batch(args.input_dir, config, args.workers, sys.stdout, args.progress_every)
+
+    print("Summary: " + json.dumps(stats), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
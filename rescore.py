@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import argparse
+from collections import Counter
+from batch_headless import load_config
+from app.core.rules import MeasurementTable, evaluate_table
+
+def read_records(path):
+    """
+    Records of a batch_headless.py JSON-lines report file.
+    """
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def rescore(records, config):
+    """
+    Re-evaluate stored measurements against the thresholds in config,
+    without re-running detection or any image processing.
+    Returns (rows, stats): one {'path', 'is_passed', 'failed'} per scored
+    record and a summary including how many verdicts changed.
+    """
+    records = list(records)
+    table = MeasurementTable.from_reports(records)
+    checks, passed = evaluate_table(table, config)
+
+    stored = {}
+    for record in records:
+        report = record.get('report')
+        if isinstance(report, dict) and 'path' in record:
+            stored[record['path']] = report.get('is_passed')
+
+    rows = []
+    failures = Counter()
+    changed = 0
+    for i, path in enumerate(table.ids):
+        failed = [name for name, column in checks.items() if not column[i]]
+        failures.update(failed)
+        is_passed = bool(passed[i])
+        if path in stored and stored[path] is not None and bool(stored[path]) != is_passed:
+            changed += 1
+        rows.append({'path': path, 'is_passed': is_passed, 'failed': failed})
+
+    stats = {
+        'images': len(table),
+        'passed': int(passed.sum()),
+        'failed': len(table) - int(passed.sum()),
+        'changed': changed,
+        'failures': dict(failures.most_common()),
+    }
+    return rows, stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score batch reports against the current thresholds.")
+    parser.add_argument("reports", help="JSON-lines file written by batch_headless.py")
+    parser.add_argument("-o", "--output", help="Write re-scored verdicts as JSON lines to this file")
+    parser.add_argument("-c", "--config", default=os.path.join("app", "config.yaml"), help="Path to config.yaml")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    rows, stats = rescore(read_records(args.reports), config)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+    print("Summary: " + json.dumps(stats), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -66,5 +66,48 @@ def generate_samples():
     
     print("Generated 10 synthetic samples in tests/samples/")
 
+# Portrait-orientation sizes (w, h) for benchmarks, VGA to 24 MP
+BENCHMARK_RESOLUTIONS = {
+    'vga': (480, 640),
+    '2mp': (1200, 1600),
+    '12mp': (3000, 4000),
+    '24mp': (4000, 6000),
+}
+
+def synthetic_portrait(width, height, seed=0):
+    """
+    Passport-style synthetic photo at any resolution: textured light gray
+    wall, head with eyes and hair, dark shoulders.
+    Returns (img, bbox, kps) with the face box and 5-point landmarks
+    (eyes, nose, mouth corners) in image coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = (205, 205, 205)
+    # Mild sensor noise (generated small and upscaled to stay fast at 24 MP)
+    noise = rng.integers(0, 12, (max(1, height // 4), max(1, width // 4), 3), dtype=np.uint8)
+    img = cv2.add(img, cv2.resize(noise, (width, height), interpolation=cv2.INTER_LINEAR))
+    
+    cx, cy = width / 2, height * 0.42
+    face_w, face_h = width * 0.34, height * 0.36
+    s = width / 350.0 # Feature scale relative to the 350x450 samples
+    
+    cv2.rectangle(img, (int(width * 0.18), int(height * 0.66)), (int(width * 0.82), height), (45, 45, 50), -1) # Shoulders
+    cv2.ellipse(img, (int(cx), int(cy - face_h * 0.12)), (int(face_w * 0.56), int(face_h * 0.56)), 0, 180, 360, (40, 50, 70), -1) # Hair
+    cv2.ellipse(img, (int(cx), int(cy)), (int(face_w / 2), int(face_h / 2)), 0, 0, 360, (150, 170, 225), -1) # Face
+    
+    eye_y = cy - face_h * 0.08
+    kps = np.array([
+        [cx - face_w * 0.2, eye_y], [cx + face_w * 0.2, eye_y], # Eyes
+        [cx, cy + face_h * 0.08], # Nose
+        [cx - face_w * 0.15, cy + face_h * 0.24], [cx + face_w * 0.15, cy + face_h * 0.24], # Mouth
+    ], dtype=np.float32)
+    for x, y in kps[:2]:
+        cv2.circle(img, (int(x), int(y)), max(2, int(8 * s)), (30, 30, 30), -1)
+    cv2.line(img, tuple(int(v) for v in kps[3]), tuple(int(v) for v in kps[4]), (60, 60, 140), max(1, int(4 * s)))
+    
+    bbox = np.array([cx - face_w / 2, cy - face_h / 2, cx + face_w / 2, cy + face_h / 2], dtype=np.float32)
+    return img, bbox, kps
+
 if __name__ == "__main__":
     generate_samples()
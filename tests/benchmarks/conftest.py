@@ -0,0 +1,68 @@
+import os
+import json
+import pytest
+import yaml
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+@pytest.fixture(scope="session")
+def bench_config():
+    config_path = os.path.join(os.path.dirname(__file__), "..", "..", "app", "config.yaml")
+    with open(config_path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+@pytest.fixture(scope="session")
+def baseline():
+    """
+    Stage timings of the reference run: {resolution: {stage: seconds}}.
+    Stages missing from the file are recorded on first run; with
+    PASSPHOTO_BENCHMARK_UPDATE=1 every measured stage replaces its entry.
+    The file is written back at the end of the session.
+    """
+    data = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r") as f:
+            data = json.load(f)
+    recorder = BaselineRecorder(data,
+                                update=os.environ.get("PASSPHOTO_BENCHMARK_UPDATE") == "1",
+                                tolerance=_env_float("PASSPHOTO_BENCHMARK_TOLERANCE", data.get("tolerance", 0.5)),
+                                min_delta=_env_float("PASSPHOTO_BENCHMARK_MIN_DELTA", data.get("min_delta", 0.005)))
+    yield recorder
+    if recorder.dirty:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(recorder.data, f, indent=4, sort_keys=True)
+
+class BaselineRecorder:
+    def __init__(self, data, update=False, tolerance=0.5, min_delta=0.005):
+        """
+        :param tolerance: Allowed slowdown relative to the baseline (0.5 = 50%)
+        :param min_delta: Absolute slack in seconds, so millisecond stages don't flap
+        """
+        self.data = data
+        self.update = update
+        self.tolerance = tolerance
+        self.min_delta = min_delta
+        self.dirty = False
+
+    def check(self, resolution, timings):
+        """
+        Compare measured {stage: seconds} against the baseline.
+        Returns a list of regression messages (empty if all stages are within tolerance).
+        """
+        reference = self.data.setdefault(resolution, {})
+        regressions = []
+        for stage, seconds in timings.items():
+            base = reference.get(stage)
+            if base is None or self.update:
+                reference[stage] = round(seconds, 6)
+                self.dirty = True
+                continue
+            limit = max(base * (1.0 + self.tolerance), base + self.min_delta)
+            if seconds > limit:
+                regressions.append(f"{resolution}/{stage}: {seconds * 1000:.1f} ms > "
+                                   f"{limit * 1000:.1f} ms (baseline {base * 1000:.1f} ms)")
+        return regressions
@@ -0,0 +1,95 @@
+"""
+Opt-in performance benchmarks for the analysis/optimize/export pipeline.
+
+    PASSPHOTO_BENCHMARK=1 python -m pytest tests/benchmarks -s
+
+Each stage is timed (median of PASSPHOTO_BENCHMARK_REPEAT runs) on synthetic
+portraits from VGA to 24 MP and compared against tests/benchmarks/baseline.json
+(see conftest.py). Detection is only timed when insightface is installed.
+"""
+import os
+import time
+import statistics
+import pytest
+from app.core.context import AnalysisContext
+from app.core.background import BackgroundChecker
+from app.core.quality import QualityChecker
+from app.core.geometry import GeometryChecker, DetectedFace
+from app.core.optimizer import ImageOptimizer
+from app.utils.export import Exporter
+from scripts.generate_samples import BENCHMARK_RESOLUTIONS, synthetic_portrait
+
+pytestmark = pytest.mark.skipif(os.environ.get("PASSPHOTO_BENCHMARK") != "1",
+                                reason="benchmarks are opt-in: set PASSPHOTO_BENCHMARK=1")
+
+REPEAT = int(os.environ.get("PASSPHOTO_BENCHMARK_REPEAT", "3"))
+
+@pytest.fixture(scope="module")
+def detector(bench_config):
+    try:
+        from app.core.face_detection import FaceDetector
+    except ImportError:
+        return None # insightface not installed: detection is not timed
+    return FaceDetector.from_config(bench_config)
+
+def _median_time(fn):
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def _analysis_timings(img, face, detector, config):
+    """
+    Time the Analyzer.run stages the way it runs them: one AnalysisContext
+    per image, shared by all stages, background mask handed to quality.
+    """
+    background = BackgroundChecker(config)
+    quality = QualityChecker(config)
+    geometry = GeometryChecker(config)
+    samples = {'detection': [], 'background': [], 'quality': [], 'geometry': []}
+    h, w = img.shape[:2]
+
+    for _ in range(REPEAT):
+        # Fresh copy: caches keyed by image identity must not carry over
+        frame = img.copy()
+        ctx = AnalysisContext(frame)
+        if detector is not None:
+            start = time.perf_counter()
+            detector.detect_faces(frame, ctx=ctx)
+            samples['detection'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        _, bg_mask = background.check_background(frame, face.bbox, ctx=ctx)
+        samples['background'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        quality.check_quality(frame, bg_mask=bg_mask, ctx=ctx)
+        samples['quality'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        geometry.check_processed_image(face, h, w)
+        samples['geometry'].append(time.perf_counter() - start)
+
+    return {stage: statistics.median(values) for stage, values in samples.items() if values}
+
+@pytest.mark.parametrize("resolution", list(BENCHMARK_RESOLUTIONS))
+def test_pipeline_stages(resolution, bench_config, detector, baseline, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # Exporter writes to ./output
+    width, height = BENCHMARK_RESOLUTIONS[resolution]
+    img, bbox, kps = synthetic_portrait(width, height)
+    face = DetectedFace(bbox, kps)
+
+    timings = _analysis_timings(img, face, detector, bench_config)
+
+    optimizer = ImageOptimizer(bench_config)
+    timings['optimize_background'] = _median_time(lambda: optimizer.optimize_background(img.copy(), face))
+
+    exporter = Exporter(bench_config)
+    timings['export'] = _median_time(lambda: exporter.export(img, face, {'is_passed': True}, "bench"))
+
+    print(f"\n{resolution} ({width}x{height}): " +
+          ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in timings.items()))
+    regressions = baseline.check(resolution, timings)
+    assert not regressions, "Performance regression:\n" + "\n".join(regressions)
@@ -0,0 +1,79 @@
+import numpy as np
+import cv2
+from app.core.background import BackgroundChecker
+from app.core.context import AnalysisContext, masked_stats
+
+def test_masked_stats_matches_numpy():
+    img = np.random.randint(0, 255, (120, 90, 3), dtype=np.uint8)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    mask = np.zeros((120, 90), np.uint8)
+    mask[:40] = 255
+    
+    stats = masked_stats(img, gray, mask)
+    
+    assert stats['count'] == 40 * 90
+    assert np.allclose(stats['mean_bgr'], np.mean(img[mask == 255], axis=0))
+    assert np.allclose(stats['std_bgr'], np.std(img[mask == 255], axis=0))
+    assert np.isclose(stats['std_gray'], np.std(gray[mask == 255]))
+
+def test_uniform_light_background(mock_config):
+    checker = BackgroundChecker(mock_config)
+    img = np.ones((400, 300, 3), dtype=np.uint8) * 210
+    cv2.circle(img, (150, 200), 60, (90, 110, 160), -1) # "Face"
+    
+    res, mask = checker.check_background(img, [90, 140, 210, 260])
+    assert res['uniformity']['passed'] == True
+    assert res['brightness']['passed'] == True
+
+def test_dark_background(mock_config):
+    checker = BackgroundChecker(mock_config)
+    img = np.ones((400, 300, 3), dtype=np.uint8) * 60
+    
+    res, mask = checker.check_background(img, [90, 140, 210, 260])
+    assert res['brightness']['passed'] == False
+
+def test_stats_shared_with_quality_check(mock_config):
+    from app.core.quality import QualityChecker
+    img = np.ones((400, 300, 3), dtype=np.uint8) * 210
+    ctx = AnalysisContext(img)
+    
+    res, mask = BackgroundChecker(mock_config).check_background(img, [90, 140, 210, 260], ctx=ctx)
+    stats = ctx.masked_stats(mask)
+    QualityChecker(mock_config).check_quality(img, bg_mask=mask, ctx=ctx)
+    # Same mask -> same memoized stats object
+    assert ctx.masked_stats(mask) is stats
+
+def test_region_map_localizes_shadow(mock_config):
+    checker = BackgroundChecker(mock_config)
+    img = np.ones((600, 400, 3), dtype=np.uint8) * 208
+    # Banded gradient in the top-left tile only, within flood fill tolerance
+    for y in range(0, 100, 8):
+        img[y:y+4, 0:100] = 202
+    
+    res, mask = checker.check_background(img, [110, 250, 290, 400])
+    region_map = res['background_map']
+    assert region_map['grid'] == [6, 4]
+    assert region_map['std'][0][0] > region_map['std'][0][3]
+    assert region_map['mean'][5][1] is None # Below the face: excluded
+
+def test_segmenter_matte_is_cached_and_used(mock_config):
+    from app.core.segmentation import Segmenter
+    
+    class FakeSegmenter(Segmenter):
+        calls = 0
+        def predict(self, img_bgr):
+            FakeSegmenter.calls += 1
+            matte = np.zeros(img_bgr.shape[:2], np.float32)
+            matte[200:, 100:300] = 1.0 # Person
+            return matte
+    
+    checker = BackgroundChecker(mock_config)
+    checker.segmenter = FakeSegmenter()
+    # Noisy wall would stop the flood fill, the segmenter does not care
+    img = np.random.randint(200, 230, (400, 300, 3), dtype=np.uint8)
+    
+    res, mask = checker.check_background(img, [120, 220, 180, 300])
+    checker.segmenter.segment(img)
+    assert FakeSegmenter.calls == 1
+    assert mask[10, 10] == 255
+    assert res['brightness']['passed'] == True
@@ -0,0 +1,22 @@
+import os
+import pytest
+from batch_headless import find_images, summarize
+
+def test_find_images_recursive_sorted(tmp_path):
+    for rel in ("b/2.PNG", "b/1.jpg", "a.jpeg", "notes.txt", "c/deep/x.bmp", "c/readme.md"):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+    found = [os.path.relpath(p, tmp_path) for p in find_images(str(tmp_path))]
+    assert found == ["a.jpeg", os.path.join("b", "1.jpg"), os.path.join("b", "2.PNG"),
+                     os.path.join("c", "deep", "x.bmp")]
+
+def test_summarize_percentiles():
+    stats = summarize(list(range(1, 101)), elapsed=4.0)
+    assert stats['images'] == 100
+    assert stats['images_per_s'] == 25.0
+    assert stats['p50_ms'] == pytest.approx(50.5)
+    assert stats['p95_ms'] == pytest.approx(95.05)
+
+def test_summarize_empty():
+    assert summarize([], elapsed=1.0) == {'images': 0, 'images_per_s': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0}
@@ -0,0 +1,43 @@
+import numpy as np
+from app.core.cache import ResultCache, content_hash, config_fingerprint
+
+PAYLOAD = {'meta': {'passed': True, 'msg': "One face detected"},
+           'face': {'bbox': np.array([1.0, 2.0, 30.0, 40.0], np.float32), 'kps': None, 'det_score': np.float32(0.9)},
+           'stages': {'quality': {'blur': {'passed': True, 'value': 120.5, 'msg': "Sharp"}}}}
+
+def test_content_hash_ignores_object_identity():
+    img = np.random.default_rng(0).integers(0, 255, (60, 40, 3), dtype=np.uint8)
+    assert content_hash(img) == content_hash(img.copy())
+    assert content_hash(img) != content_hash(img[:, ::-1]) # Mirrored
+    assert content_hash(img) != content_hash(img.reshape(40, 60, 3))
+
+def test_fingerprint_tracks_thresholds(mock_config):
+    changed = dict(mock_config, thresholds=dict(mock_config['thresholds'], blur_min_score=50.0))
+    assert config_fingerprint(mock_config) == config_fingerprint(dict(mock_config))
+    assert config_fingerprint(mock_config) != config_fingerprint(changed)
+
+def test_fingerprint_tracks_schema_version(mock_config, monkeypatch):
+    from app.core import cache
+    before = config_fingerprint(mock_config)
+    monkeypatch.setattr(cache, 'CACHE_SCHEMA_VERSION', cache.CACHE_SCHEMA_VERSION + 1)
+    assert config_fingerprint(mock_config) != before
+
+def test_memory_tier_lru():
+    cache = ResultCache("fp", max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, PAYLOAD)
+    assert cache.get("a") is None
+    hit = cache.get("c")
+    assert hit['face']['bbox'] == [1.0, 2.0, 30.0, 40.0]
+    hit['stages'].clear() # Callers get copies
+    assert cache.get("c")['stages']
+
+def test_disk_tier_survives_restart(tmp_path):
+    db = str(tmp_path / "cache" / "results.sqlite")
+    cache = ResultCache("fp", db_path=db)
+    cache.put("k", PAYLOAD)
+    cache.close()
+    
+    reopened = ResultCache("fp", db_path=db)
+    assert reopened.get("k")['stages'] == {'quality': {'blur': {'passed': True, 'value': 120.5, 'msg': "Sharp"}}}
+    reopened.close()
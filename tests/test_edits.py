@@ -0,0 +1,68 @@
+import numpy as np
+import cv2
+from app.core.edits import PixelEdit, CropEdit, compose_edits
+from app.core.geometry import DetectedFace, transform_face
+
+def test_pixel_edit_skips_geometry():
+    assert PixelEdit().stages() == {'background', 'quality'}
+    assert CropEdit((50, 50), (40, 40)).stages() == {'background', 'quality', 'geometry'}
+
+def test_crop_matrix_matches_getRectSubPix():
+    img = np.zeros((200, 300), np.uint8)
+    img[120, 170] = 255 # Marker
+    center, size = (160.5, 110.5), (80, 60)
+    
+    cropped = cv2.getRectSubPix(img, size, center)
+    edit = CropEdit(center, size)
+    face = DetectedFace([160, 110, 180, 130], [[170, 120]] * 5)
+    moved = transform_face(face, edit.matrix)
+    
+    y, x = np.unravel_index(np.argmax(cropped), cropped.shape)
+    assert np.allclose(moved.kps[0], [x, y])
+    assert np.allclose(moved.bbox[2:] - moved.bbox[:2], [20, 20])
+
+def test_compose_crops():
+    first = CropEdit((100, 100), (101, 101))
+    second = CropEdit((30, 30), (21, 21))
+    combined = compose_edits([PixelEdit(), first, second])
+    
+    face = DetectedFace([60, 60, 80, 80], [[70, 70]] * 5)
+    step = transform_face(transform_face(face, first.matrix), second.matrix)
+    direct = transform_face(face, combined.matrix)
+    assert np.allclose(step.kps, direct.kps)
+    assert combined.stages() == {'background', 'quality', 'geometry'}
+
+def test_edit_stack_memoizes_and_fuses():
+    from app.core.edits import EditStack, AdjustEdit
+    from app.core.optimizer import apply_adjustments
+    rng = np.random.default_rng(0)
+    original = rng.integers(0, 255, (400, 300, 3), dtype=np.uint8)
+    pristine = original.copy()
+    stack = EditStack(original, preview_max_side=200)
+    assert stack.preview().shape[:2] == (200, 150)
+    
+    stack.push(AdjustEdit(brightness=1.1))
+    stack.push(AdjustEdit(brightness=0.9))
+    full = stack.render()
+    # One pass with the cumulative factor, not two compounding ones
+    assert np.array_equal(full, apply_adjustments(original, brightness=1.1 * 0.9))
+    
+    stack.push(CropEdit((150, 200), (100, 120)))
+    cropped = stack.render()
+    assert cropped.shape[:2] == (120, 100)
+    assert stack.preview().shape[:2] == (60, 50)
+    
+    stack.undo()
+    assert stack.render() is full # Memoized
+    stack.redo()
+    assert stack.render() is cropped
+    stack.reset()
+    assert stack.render() is original and not stack.can_undo
+    assert np.array_equal(original, pristine)
+
+def test_undo_crop_restores_face():
+    edit = CropEdit((100, 100), (101, 101))
+    face = DetectedFace([60, 60, 80, 80], [[70, 70]] * 5)
+    back = transform_face(transform_face(face, edit.matrix), edit.inverse().matrix)
+    assert np.allclose(back.bbox, face.bbox)
+    assert edit.inverse().stages() == edit.stages()
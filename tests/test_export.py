@@ -0,0 +1,119 @@
+import os
+import numpy as np
+import cv2
+import pytest
+from app.utils.export import Exporter, encode_jpeg_within
+
+@pytest.fixture
+def noisy_image():
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 255, (400, 300, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(img, (3, 3), 0)
+
+def test_encode_highest_quality_within_budget(noisy_image):
+    full = len(cv2.imencode(".jpg", noisy_image, [cv2.IMWRITE_JPEG_QUALITY, 95])[1])
+    budget = full // 2
+    
+    buf, quality = encode_jpeg_within(noisy_image, budget)
+    assert len(buf) < budget
+    assert 15 <= quality < 95
+    # One step higher would not have fit
+    above = cv2.imencode(".jpg", noisy_image, [cv2.IMWRITE_JPEG_QUALITY, quality + 1])[1]
+    assert len(above) >= budget
+
+def test_encode_small_image_keeps_max_quality(noisy_image):
+    buf, quality = encode_jpeg_within(noisy_image, 10 * 1024 * 1024)
+    assert quality == 95
+
+def test_encode_falls_back_to_min_quality(noisy_image):
+    buf, quality = encode_jpeg_within(noisy_image, 100)
+    assert quality == 15
+
+def test_save_compressed_writes_file(tmp_path, monkeypatch, mock_config, noisy_image):
+    monkeypatch.chdir(tmp_path)
+    exporter = Exporter(mock_config)
+    path = os.path.join(exporter.output_dir, "test.jpg")
+    
+    quality = exporter._save_compressed(path, noisy_image, max_size_bytes=40 * 1024)
+    assert os.path.getsize(path) < 40 * 1024
+    assert cv2.imread(path).shape == noisy_image.shape
+    # The file is exactly the encoding at the returned quality
+    assert 15 <= quality <= 95
+    with open(path, "rb") as f:
+        assert f.read() == cv2.imencode(".jpg", noisy_image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+def test_export_queue_backpressure(tmp_path, monkeypatch, mock_config):
+    import threading
+    from app.utils.export import ExportQueue
+    monkeypatch.chdir(tmp_path)
+    queue = ExportQueue(Exporter(mock_config), workers=1, max_pending=1)
+    
+    release = threading.Event()
+    done = []
+    first = queue.submit(release.wait, callback=lambda f: done.append(f.result()))
+    assert first is not None
+    assert queue.submit(release.wait) is None # Full
+    
+    release.set()
+    first.result(timeout=5)
+    queue.shutdown()
+    assert done == [True]
+
+def test_concurrent_exports_get_unique_names(tmp_path, monkeypatch, mock_config, noisy_image):
+    from app.utils.export import ExportQueue
+    monkeypatch.chdir(tmp_path)
+    queue = ExportQueue(Exporter(mock_config), workers=2, max_pending=4)
+    
+    futures = [queue.save_exact_image(noisy_image, {'is_passed': True}) for _ in range(3)]
+    paths = {f.result(timeout=10)['image_path'] for f in futures}
+    queue.shutdown()
+    assert len(paths) == 3
+
+def _naive_warp(img, scale, center, size):
+    M = cv2.getRotationMatrix2D(center, 0, scale)
+    M[0, 2] += size[0] / 2 - center[0]
+    M[1, 2] += size[1] / 2 - center[1]
+    return M, cv2.warpAffine(img, M, size, flags=cv2.INTER_LANCZOS4)
+
+@pytest.mark.parametrize("scale,center", [(1.3, (150, 200)), (0.7, (150, 200)), (1.0, (10, 10))])
+def test_warp_roi_matches_full_frame(noisy_image, scale, center):
+    from app.utils.export import warp_roi
+    M, expected = _naive_warp(noisy_image, scale, center, (120, 160))
+    assert np.array_equal(warp_roi(noisy_image, M, (120, 160)), expected)
+
+def test_warp_roi_predownscale_close(noisy_image):
+    from app.utils.export import warp_roi
+    smooth = cv2.GaussianBlur(noisy_image, (0, 0), 4)
+    M, expected = _naive_warp(smooth, 0.25, (150, 200), (60, 80))
+    diff = np.abs(warp_roi(smooth, M, (60, 80)).astype(int) - expected)
+    assert diff.mean() < 2
+
+@pytest.mark.parametrize("scale", [0.1, 0.2, 0.3, 0.45])
+def test_warp_roi_flat_edges_exact(scale):
+    from app.utils.export import warp_roi
+    # Output well inside the image: no border pixels may leak into the edges
+    flat = np.full((2000, 1500, 3), 128, np.uint8)
+    M, _ = _naive_warp(flat, scale, (750, 1000), (100, 120))
+    out = warp_roi(flat, M, (100, 120))
+    for edge in (out[0], out[-1], out[:, 0], out[:, -1]):
+        assert np.all(edge == 128)
+
+def test_export_presets_cascade(tmp_path, monkeypatch, mock_config, mock_face):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(2)
+    img = cv2.GaussianBlur(rng.integers(0, 255, (1000, 800, 3), dtype=np.uint8), (0, 0), 2)
+    exporter = Exporter(mock_config)
+    face = mock_face([300, 300, 500, 560], np.zeros((5, 2)))
+    
+    res = exporter.export_presets(img, face, {'is_passed': True}, presets=['print', 'web', 'thumbnail'])
+    assert set(res['images']) == {'print', 'web', 'thumbnail'}
+    assert res['image_path'] == res['images']['print']
+    assert cv2.imread(res['images']['print']).shape[:2] == (1062, 826)
+    assert cv2.imread(res['images']['web']).shape[:2] == (531, 413)
+    assert cv2.imread(res['images']['thumbnail']).shape[1] == 160
+    assert os.path.exists(res['json_path'])
+
+def test_export_presets_unknown(tmp_path, monkeypatch, mock_config, mock_face, noisy_image):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError):
+        Exporter(mock_config).export_presets(noisy_image, mock_face([0, 0, 10, 10], None), {}, presets=['poster'])
@@ -0,0 +1,138 @@
+import sys
+import types
+import importlib
+import numpy as np
+import pytest
+
+class StubFace(dict):
+    """
+    Minimal insightface Face: a dict with attribute access.
+    """
+    __getattr__ = dict.get
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+class StubFaceAnalysis:
+    """
+    Stands in for insightface's FaceAnalysis: "detects" the bright rectangle
+    of the image it is given, with landmarks at fixed fractions of it.
+    """
+    instances = []
+
+    def __init__(self, name=None, providers=None, allowed_modules=None):
+        self.name = name
+        self.allowed_modules = allowed_modules
+        self.prepared = None
+        self.inputs = []
+        StubFaceAnalysis.instances.append(self)
+
+    def prepare(self, ctx_id=0, det_size=(640, 640)):
+        self.prepared = det_size
+
+    def get(self, img):
+        self.inputs.append(img.shape[:2])
+        ys, xs = np.nonzero(img[:, :, 0] > 127)
+        if len(xs) == 0:
+            return []
+        x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+        return [StubFace(bbox=np.array([x1, y1, x2, y2], dtype=np.float32),
+                         kps=_landmarks(x1, y1, x2, y2))]
+
+# Eyes, nose, mouth corners as fractions of the bbox
+_KPS_FRACTIONS = np.array([[0.3, 0.4], [0.7, 0.4], [0.5, 0.6], [0.35, 0.8], [0.65, 0.8]])
+
+def _landmarks(x1, y1, x2, y2):
+    return (np.array([x1, y1]) + _KPS_FRACTIONS * np.array([x2 - x1, y2 - y1])).astype(np.float32)
+
+@pytest.fixture
+def face_detection(monkeypatch):
+    """
+    app.core.face_detection imported against a stub insightface package
+    (fresh module, so its model registry starts empty).
+    """
+    insightface = types.ModuleType("insightface")
+    insightface_app = types.ModuleType("insightface.app")
+    insightface_app.FaceAnalysis = StubFaceAnalysis
+    insightface.app = insightface_app
+    monkeypatch.setitem(sys.modules, "insightface", insightface)
+    monkeypatch.setitem(sys.modules, "insightface.app", insightface_app)
+    StubFaceAnalysis.instances = []
+
+    # Put back whatever was imported before (or nothing), so later tests never see the stub
+    import app.core
+    saved_module = sys.modules.pop("app.core.face_detection", None)
+    saved_attr = app.core.__dict__.pop("face_detection", None)
+    try:
+        yield importlib.import_module("app.core.face_detection")
+    finally:
+        sys.modules.pop("app.core.face_detection", None)
+        app.core.__dict__.pop("face_detection", None)
+        if saved_module is not None:
+            sys.modules["app.core.face_detection"] = saved_module
+        if saved_attr is not None:
+            app.core.face_detection = saved_attr
+
+def test_registry_hit_and_miss(face_detection):
+    first = face_detection.get_face_analysis('buffalo_l', det_size=(640, 640), allowed_modules=('detection',))
+    again = face_detection.get_face_analysis('buffalo_l', det_size=[640, 640], allowed_modules=['detection'])
+    assert again is first
+    assert len(StubFaceAnalysis.instances) == 1
+    assert first.prepared == (640, 640)
+
+    other_size = face_detection.get_face_analysis('buffalo_l', det_size=(320, 320), allowed_modules=('detection',))
+    all_modules = face_detection.get_face_analysis('buffalo_l', det_size=(640, 640))
+    assert other_size is not first and all_modules is not first
+    assert all_modules.allowed_modules is None
+    assert len(StubFaceAnalysis.instances) == 3
+
+def test_registry_eviction(face_detection):
+    detection = face_detection.get_face_analysis('buffalo_l', allowed_modules=('detection',))
+    full = face_detection.get_face_analysis('buffalo_l')
+    small = face_detection.get_face_analysis('buffalo_l', det_size=(320, 320), allowed_modules=('detection',))
+
+    assert face_detection.evict_face_analysis(allowed_modules=['detection'], det_size=(640, 640)) == 1
+    assert face_detection.get_face_analysis('buffalo_l') is full
+    assert face_detection.get_face_analysis('buffalo_l', det_size=(320, 320), allowed_modules=('detection',)) is small
+    # Evicted entry is loaded again on the next request
+    assert face_detection.get_face_analysis('buffalo_l', allowed_modules=('detection',)) is not detection
+
+    assert face_detection.evict_face_analysis() == 3
+    assert face_detection._MODEL_CACHE == {}
+
+def _portrait(h, w, box):
+    img = np.zeros((h, w, 3), np.uint8)
+    x1, y1, x2, y2 = box
+    img[y1:y2, x1:x2] = 255
+    return img
+
+@pytest.mark.parametrize("proxy_max_side", [1200, 600, 300, 160])
+def test_proxy_detection_maps_to_full_resolution(face_detection, proxy_max_side):
+    box = (400, 300, 800, 850)
+    img = _portrait(1200, 1000, box)
+    detector = face_detection.FaceDetector(proxy_max_side=proxy_max_side)
+    faces, _ = detector.detect_faces(img)
+
+    scale = min(1.0, proxy_max_side / 1200)
+    assert detector.app.inputs == [(round(1200 * scale), round(1000 * scale))]
+    # Exact up to one proxy pixel
+    tol = 1.0 / scale
+    assert np.allclose(faces[0].bbox, box, atol=tol)
+    assert np.allclose(faces[0].kps, _landmarks(*box), atol=tol)
+    assert faces[0].bbox.dtype == np.float32
+
+def test_refine_redetects_on_full_resolution_crop(face_detection):
+    box = (1001, 1203, 1507, 1909)
+    img = _portrait(3000, 2500, box)
+    coarse, _ = face_detection.FaceDetector(proxy_max_side=200).detect_faces(img)
+    detector = face_detection.FaceDetector(proxy_max_side=200, refine=True)
+    refined, _ = detector.detect_faces(img)
+
+    # Second pass ran on a face-centred crop (about 3x the face), not the whole frame
+    full_proxy, crop = detector.app.inputs[-2:]
+    assert full_proxy == (200, 167)
+    assert crop[0] == 200 and abs(crop[1] - 200 * 3 * 506 / (3 * 706)) < 3
+    coarse_err = np.abs(coarse[0].bbox - box).max()
+    refined_err = np.abs(refined[0].bbox - box).max()
+    assert refined_err < coarse_err
+    assert np.allclose(refined[0].kps, _landmarks(*box), atol=refined_err + 1)
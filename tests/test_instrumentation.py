@@ -0,0 +1,64 @@
+import json
+import time
+import threading
+import tracemalloc
+from app.core.instrumentation import Profiler, JsonLinesSink, HistogramSink
+
+def test_disabled_profiler_is_noop():
+    profiler = Profiler.from_config({})
+    run = profiler.begin()
+    with run.stage('detection'):
+        pass
+    assert profiler.finish(run) is None
+
+def test_stage_timings_and_sinks(tmp_path):
+    path = tmp_path / "timings.jsonl"
+    histogram = HistogramSink()
+    profiler = Profiler(enabled=True, trace_memory=True, sinks=[JsonLinesSink(str(path)), histogram])
+    
+    for _ in range(3):
+        run = profiler.begin()
+        with run.stage('quality'):
+            buf = bytearray(2 * 1024 * 1024)
+            time.sleep(0.01)
+        timings = profiler.finish(run, width=10, height=20)
+        del buf
+    
+    assert timings['quality']['wall_ms'] >= 10
+    assert timings['quality']['peak_kb'] >= 2048
+    assert timings['total']['wall_ms'] >= timings['quality']['wall_ms']
+    
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(lines) == 3 and lines[0]['width'] == 10
+    summary = histogram.summary()['quality']
+    assert summary['count'] == 3 and summary['p50_ms'] == 20
+    tracemalloc.stop()
+
+def test_traced_stages_do_not_see_other_threads():
+    profiler = Profiler(enabled=True, trace_memory=True)
+    entered = threading.Event()
+    results = {}
+    
+    def idle():
+        run = profiler.begin()
+        with run.stage('geometry'):
+            entered.set()
+            time.sleep(0.05)
+        results['idle'] = profiler.finish(run)
+    
+    def allocate():
+        entered.wait()
+        run = profiler.begin()
+        with run.stage('quality'):
+            buf = bytearray(4 * 1024 * 1024)
+            del buf
+        results['allocate'] = profiler.finish(run)
+    
+    threads = [threading.Thread(target=idle), threading.Thread(target=allocate)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results['idle']['geometry']['peak_kb'] < 1024
+    assert results['allocate']['quality']['peak_kb'] >= 4096
+    tracemalloc.stop()
@@ -0,0 +1,49 @@
+import io
+import json
+import logging
+import numpy as np
+import pytest
+from app.core import log
+from app.core.log import configure_logging, correlation, get_correlation_id
+from app.core.quality import QualityChecker
+
+@pytest.fixture
+def restore_logging():
+    """
+    Undo configure_logging(): put back the 'app' logger's handlers and level.
+    """
+    app_logger = logging.getLogger('app')
+    handlers, level, installed = app_logger.handlers[:], app_logger.level, log._handler
+    yield
+    if log._handler is not None and log._handler not in handlers:
+        log._handler.close()
+    app_logger.handlers[:] = handlers
+    app_logger.setLevel(level)
+    log._handler = installed
+
+def test_correlation_nesting():
+    assert get_correlation_id() is None
+    with correlation("img-1") as outer:
+        with correlation() as inner: # Analyzer.run inside the batch runner
+            assert inner == outer == "img-1"
+    with correlation() as generated:
+        assert generated and generated != "img-1"
+    assert get_correlation_id() is None
+
+def test_json_lines_output(mock_config, restore_logging):
+    stream = io.StringIO()
+    configure_logging({'app': {'log_level': 'DEBUG', 'log_format': 'json'}}, stream=stream)
+    with correlation("photo.jpg"):
+        QualityChecker(mock_config).check_quality(np.full((40, 40, 3), 200, np.uint8))
+        logging.getLogger("app.core.test").info("done", extra={'images': 3})
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert records[0]['logger'] == "app.core.quality"
+    assert records[0]['correlation_id'] == "photo.jpg"
+    assert records[-1]['images'] == 3
+    
+    # Below the level nothing is formatted or written
+    configure_logging({'app': {'log_level': 'INFO'}}, stream=stream)
+    stream.seek(0)
+    stream.truncate(0)
+    QualityChecker(mock_config).check_quality(np.full((40, 40, 3), 200, np.uint8))
+    assert stream.getvalue() == ""
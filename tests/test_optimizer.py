@@ -0,0 +1,82 @@
+import numpy as np
+import cv2
+from app.core.optimizer import ImageOptimizer
+
+def make_portrait(h=1200, w=900):
+    # Textured blue-gray wall, skin-colored head and dark shirt
+    rng = np.random.default_rng(0)
+    img = np.empty((h, w, 3), np.uint8)
+    img[:] = (150, 120, 100)
+    img = cv2.add(img, rng.integers(0, 20, (h, w, 3), dtype=np.uint8))
+    cv2.ellipse(img, (w // 2, int(h * 0.4)), (int(w * 0.17), int(h * 0.19)), 0, 0, 360, (120, 160, 220), -1)
+    cv2.rectangle(img, (int(w * 0.2), int(h * 0.62)), (int(w * 0.8), h), (40, 40, 40), -1)
+    bbox = [w * 0.33, h * 0.21, w * 0.67, h * 0.59]
+    return img, bbox
+
+def test_multires_background_replacement():
+    img, bbox = make_portrait()
+    optimizer = ImageOptimizer({'optimizer': {'background_mode': 'multires', 'grabcut_max_side': 300}})
+    
+    alpha = optimizer.foreground_alpha(img, bbox)
+    assert alpha.shape == img.shape[:2]
+    assert alpha[480, 450] > 0.9 # Face
+    assert alpha[1100, 450] > 0.9 # Shirt
+    assert alpha[50, 50] < 0.1 # Wall
+    
+    class Face:
+        pass
+    face = Face()
+    face.bbox = np.array(bbox)
+    out = optimizer.optimize_background(img, face)
+    assert np.all(out[20, 20] == 220)
+    assert np.array_equal(out[480, 450], img[480, 450])
+
+def test_multires_keeps_wide_shoulders():
+    # Shoulders far wider than the face reach close to the image edges
+    rng = np.random.default_rng(1)
+    img = cv2.add(np.full((1200, 900, 3), (150, 120, 100), np.uint8),
+                  rng.integers(0, 20, (1200, 900, 3), dtype=np.uint8))
+    cv2.ellipse(img, (450, 440), (120, 180), 0, 0, 360, (120, 160, 220), -1)
+    cv2.rectangle(img, (60, 700), (840, 1200), (40, 40, 40), -1)
+    bbox = [330, 260, 570, 620]
+    optimizer = ImageOptimizer({'optimizer': {'background_mode': 'multires', 'grabcut_max_side': 300}})
+    
+    alpha = optimizer.foreground_alpha(img, bbox)
+    assert alpha[1000, 100] > 0.9 # Shoulder, outside face box +- 0.9x face width
+    assert alpha[1000, 800] > 0.9
+    assert alpha[1000, 30] < 0.1 # Wall beside the shoulders
+    assert alpha[100, 100] < 0.1
+
+def test_composite_soft_alpha_reuses_buffers():
+    optimizer = ImageOptimizer({'optimizer': {'background_color': [200, 100, 0]}})
+    img = np.zeros((40, 60, 3), np.uint8)
+    alpha = np.zeros((40, 60), np.float32)
+    alpha[:, 30:] = 1.0
+    alpha[:, 29] = 0.5
+    
+    out = optimizer.composite(img, alpha)
+    assert np.array_equal(out[0, 0], [200, 100, 0])
+    assert np.array_equal(out[0, 59], [0, 0, 0])
+    assert np.allclose(out[0, 29], [100, 50, 0], atol=1)
+    
+    bg = optimizer._buffers['bg']
+    out2 = optimizer.composite(img, alpha)
+    assert optimizer._buffers['bg'] is bg
+    assert out2 is not out # Results are never shared buffers
+
+def test_fused_lut_matches_reference_and_is_cached():
+    from app.core.optimizer import build_lut, apply_adjustments
+    img = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    img = cv2.merge([img, img, img])
+    
+    out = ImageOptimizer().adjust_brightness(img, 1.2)
+    expected = np.clip(np.rint((np.arange(256) / 255.0) ** (1 / 1.2) * 255), 0, 255)
+    assert np.array_equal(out[..., 1].ravel(), expected)
+    assert build_lut(1.2) is build_lut(1.2)
+    assert apply_adjustments(img) is img
+    
+    # Cumulative parameters from the original instead of compounding edits
+    once = apply_adjustments(img, brightness=1.1 * 0.9 * 1.1, contrast=1.1, wb=(1.0, 1.0, 1.05))
+    fused = cv2.LUT(img, build_lut(round(1.1 * 0.9 * 1.1, 4), 1.0, 1.1, (1.0, 1.0, 1.05)))
+    assert np.array_equal(once, fused)
+    assert (once[..., 2] >= once[..., 0]).all() # Warmer: red gain
@@ -0,0 +1,93 @@
+import numpy as np
+import cv2
+from app.core.rules import MeasurementTable, evaluate_table
+from app.core.background import BackgroundChecker
+from app.core.quality import QualityChecker
+from app.core.geometry import GeometryChecker
+from rescore import rescore
+
+def _records(mock_config, mock_face):
+    """
+    Batch-style records measured by the checkers themselves, scored per row.
+    """
+    background = BackgroundChecker(mock_config)
+    quality = QualityChecker(mock_config)
+    geometry = GeometryChecker(mock_config)
+    rng = np.random.default_rng(0)
+    faces = [
+        mock_face([75, 90, 225, 370], [[120, 170], [180, 170], [150, 220], [125, 280], [175, 280]]),
+        mock_face([60, 20, 240, 320], [[110, 100], [190, 112], [170, 150], [125, 190], [175, 190]]),
+        mock_face([80, 60, 220, 250], []),
+        # Face box covers the image: no background pixels at all
+        mock_face([0, 0, 300, 400], [[120, 170], [180, 170], [150, 220], [125, 280], [175, 280]]),
+    ]
+    records = []
+    for i, face in enumerate(faces):
+        if i == 0:
+            # Light wall, textured face: passes every check
+            img = np.full((400, 300, 3), 200, np.uint8)
+            face_mask = cv2.ellipse(np.zeros((400, 300), np.uint8), (150, 230), (75, 140), 0, 0, 360, 255, -1)
+            img[face_mask > 0] = rng.integers(40, 160, (np.count_nonzero(face_mask), 3), dtype=np.uint8)
+        elif i == 1:
+            img = rng.integers(0, 255, (400, 300, 3), dtype=np.uint8)
+        else:
+            img = np.full((400, 300, 3), 235, np.uint8)
+        measurements = {}
+        measurements['background'], mask = background.measure_background(img, face.bbox)
+        measurements['quality'] = quality.measure(img, bg_mask=mask)
+        measurements['geometry'] = geometry.measure(face, 400, 300)
+        report = {'meta': {'passed': True}, 'face_bbox': list(face.bbox), 'measurements': measurements}
+        for stage, checker in (('background', background), ('quality', quality), ('geometry', geometry)):
+            report.update(checker.evaluate(measurements[stage]))
+        report['is_passed'] = all(v.get('passed', True) for k, v in report.items()
+                                  if isinstance(v, dict) and k != 'measurements')
+        records.append({'path': f"img{i}.jpg", 'report': report})
+    return records
+
+def test_table_matches_per_image_evaluation(mock_config, mock_face):
+    records = _records(mock_config, mock_face)
+    table = MeasurementTable.from_reports(records)
+    checks, passed = evaluate_table(table, mock_config)
+
+    for i, record in enumerate(records):
+        report = record['report']
+        assert passed[i] == report['is_passed']
+        for name in ('uniformity', 'brightness', 'blur', 'exposure', 'contrast',
+                     'face_height', 'eye_position', 'eyes_level', 'nose_center', 'roll'):
+            if name in report:
+                assert checks[name][i] == report[name]['passed'], (i, name)
+        # Checks the checkers skipped are not reported as failures; a missing
+        # landmark set is reported by the geometry checker as 'meta'
+        failed = {name for name, column in checks.items() if not column[i]}
+        reported = {k for k, v in report.items() if isinstance(v, dict) and not v.get('passed', True)}
+        if 'landmarks' in failed:
+            assert report['meta']['msg'] == "Landmarks missing"
+            failed.discard('landmarks')
+        assert failed == reported, i
+    assert not checks['background'][3] and checks['brightness'][3]
+
+def test_missing_measurements_fail(mock_config, mock_face):
+    records = _records(mock_config, mock_face)
+    records.append({'path': "noface.jpg", 'report': {'meta': {'passed': False}, 'is_passed': False}})
+    records.append({'path': "old.jpg", 'report': {'meta': {'passed': True}, 'face_bbox': [0, 0, 1, 1],
+                                                  'is_passed': True}})
+    records.append({'path': "broken.jpg", 'error': "Could not load image"})
+    checks, passed = evaluate_table(MeasurementTable.from_reports(records), mock_config)
+    # Landmarks missing (row 2), no face (row 4), face without stored measurements
+    # (row 5); load errors are skipped
+    assert len(passed) == 6
+    assert not passed[2] and not passed[4] and not passed[5]
+    assert not checks['landmarks'][2]
+    assert [name for name, column in checks.items() if not column[4]] == ['meta']
+    assert [name for name, column in checks.items() if not column[5]] == ['measurements']
+
+def test_rescore_with_new_thresholds(mock_config, mock_face):
+    records = _records(mock_config, mock_face)
+    rows, stats = rescore(records, mock_config)
+    assert stats['changed'] == 0
+    assert rows[0]['is_passed'] and stats['passed'] == 1
+
+    strict = dict(mock_config, thresholds=dict(mock_config['thresholds'], blur_min_score=1e9))
+    rows, stats = rescore(records, strict)
+    assert stats['passed'] == 0 and stats['changed'] == 1
+    assert 'blur' in rows[0]['failed']